@@ -1,8 +1,14 @@
+import time
+_T0 = time.perf_counter()
+
 import os
-client.run(os.getenv("DISCORD_TOKEN"))
 import discord
 from discord.ext import commands
 from collector_cog import Collector
+from startup import StartupTimer, sync_if_changed
+
+timer = StartupTimer(_T0)
+timer.mark("imports")
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -13,18 +19,27 @@ bot = commands.Bot(command_prefix="!", intents=intents)
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user} ({bot.user.id})")
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} commands.")
-    except Exception as e:
-        print("Command sync error:", e)
+    if not timer.reported:
+        timer.mark("ready to serve")
+        print(timer.report())
 
 
 @bot.event
 async def setup_hook():
     await bot.add_cog(Collector(bot))
+    timer.mark("cogs loaded")
 
+    # setup_hook runs once per process, unlike on_ready which fires on every
+    # reconnect; the fingerprint also skips the sync across restarts.
+    try:
+        synced = await sync_if_changed(bot, force=bool(os.getenv("VHC_FORCE_SYNC")))
+        if synced is None:
+            print("Command tree unchanged; skipped sync.")
+        else:
+            print(f"Synced {len(synced)} commands.")
+    except Exception as e:
+        print("Command sync error:", e)
+    timer.mark("command tree")
 
 
-bot.run("DISCORD_TOKEN")
-
+bot.run(os.getenv("DISCORD_TOKEN"))
@@ -1,29 +1,103 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
+import asyncio
+import functools
+from typing import Optional
 
-from parser import (
-    detect_template_type,
-    parse_system_entry,
-    parse_planet_entry,
-    parse_flora_entry,
-    parse_fauna_entry,
-    parse_archaeology_entry,
-    parse_mineral_entry
-)
+from history import fetch_history
+from jobs import JobConflict, JobManager, STATUS_EDIT_INTERVAL
+from workers import LoopLagMonitor, ParsePipeline, shutdown_executor
+
+QUARANTINE_LISTED = 5
+SEARCH_RESULTS = 10
+STATS_TOP = 10
+NEAREST_RESULTS = 10
+WITHIN_LISTED = 20
+
+ENTRY_TYPE_CHOICES = [
+    app_commands.Choice(name=t.capitalize(), value=t)
+    for t in ("system", "planet", "flora", "fauna", "archaeology", "mineral")
+]
+STATS_DIMENSION_CHOICES = [
+    app_commands.Choice(name=d.replace("_", " ").capitalize(), value=d)
+    for d in ("entries_by_type", "systems_by_region", "economy_type", "economy_status",
+              "conflict_level", "planet_resources")
+]
+
+
+def _run_blocking(fn, *args, **kwargs):
+    """Run fn in the default thread pool; index updates and queries never block the gateway."""
+    return asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+def _update_indexes(guild_id: int, thread_id: int, entries: list, terms: list):
+    """
+    Executor side of a finished collection: fold entries into the indexes and
+    persist them. The thread was read in full, so anything indexed for it
+    earlier that is not in `entries` was deleted or edited away.
+    """
+    import galaxy
+    import search_index
+    import stats
+
+    index = search_index.get_index()
+    engine = stats.get_stats()
+    space = galaxy.get_galaxy()
+    for entry, entry_terms in zip(entries, terms):
+        index.add(entry, guild_id, entry_terms)
+        engine.add(entry, guild_id)
+        space.add(entry, guild_id)
+    keep = {entry.key for entry in entries}
+    index.retire_missing(thread_id, keep)
+    engine.retire_missing(thread_id, keep)
+    space.retire_missing(thread_id, keep)
+    index.flush()
+    engine.save()
+    engine.dump_json()
+    space.save()
+
+
+def _warm_indexes():
+    """Load the on-disk indexes so the first query doesn't pay for the journal replay."""
+    import galaxy
+    import search_index
+    import stats
+
+    search_index.get_index()
+    stats.get_stats()
+    galaxy.get_galaxy()
 
 
 class Collector(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.jobs = JobManager(self._run_collection)
+        self._warmup: Optional[asyncio.Task] = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Once the bot is serving, not at load: startup stays free of the
+        # parsers and NumPy, and on_ready fires again on every reconnect
+        if self._warmup is None:
+            self._warmup = asyncio.create_task(self._warm_indexes())
+
+    async def _warm_indexes(self):
+        try:
+            await _run_blocking(_warm_indexes)
+        except Exception as e:
+            print("[INDEX] could not load indexes:", e)
+
+    async def cog_unload(self):
+        await self.jobs.stop()
+        shutdown_executor()
 
     @app_commands.command(
         name="collect_entry",
         description="Scan this entire thread, parse all valid templates, and export them to JSON."
     )
-    async def collect_entry(self, interaction: discord.Interaction):
+    @app_commands.describe(dispatch="Also send each entry to the collector endpoints as it is parsed")
+    async def collect_entry(self, interaction: discord.Interaction, dispatch: bool = False):
 
         channel = interaction.channel
 
@@ -34,66 +108,330 @@ class Collector(commands.Cog):
                 ephemeral=True
             )
 
-        await interaction.response.defer(ephemeral=True)
+        try:
+            job, attached = self.jobs.submit(interaction.guild_id, channel, interaction.user.id, dispatch=dispatch)
+        except JobConflict as e:
+            # Fetching the thread a second time just to dispatch it isn't worth it
+            return await interaction.response.send_message(
+                f"Job #{e.job.id} is already collecting this thread without dispatch. "
+                f"Run `/collect_entry dispatch:True` again once it has finished.",
+                ephemeral=True
+            )
+        if attached:
+            # Someone else already collected (or is collecting) this thread;
+            # share that run instead of scraping and exporting it twice.
+            if job.finished:
+                return await interaction.response.send_message(
+                    f"This thread was just collected by job #{job.id}:\n{job.render()}",
+                    ephemeral=True
+                )
+            return await interaction.response.send_message(
+                f"Attached to in-flight collection job #{job.id} for this thread. "
+                f"Use `/collect_status {job.id}` to follow it.",
+                ephemeral=True
+            )
 
-        # Fetch ALL messages in the thread
-        messages = [m async for m in channel.history(limit=None)]
+        # The interaction token expires long before a big thread is done, so
+        # progress lives in a regular thread message that the job keeps editing.
+        await interaction.response.send_message(
+            f"Queued collection job #{job.id}. Progress is posted in this thread; "
+            f"use `/collect_status {job.id}` or `/collect_cancel {job.id}`.",
+            ephemeral=True
+        )
+        try:
+            job.status_message = await channel.send(job.render())
+        except discord.HTTPException as e:
+            print(f"[JOB {job.id}] could not post status message:", e)
+        asyncio.create_task(self._status_ticker(job))
 
-        parsed_entries = []
+    @app_commands.command(
+        name="collect_status",
+        description="Show the progress of a collection job, or all jobs in this server."
+    )
+    @app_commands.describe(job_id="Job number returned by /collect_entry")
+    async def collect_status(self, interaction: discord.Interaction, job_id: Optional[int] = None):
+        if job_id is not None:
+            job = self.jobs.get(job_id)
+            if job is None or job.guild_id != interaction.guild_id:
+                return await interaction.response.send_message(f"No job #{job_id} found.", ephemeral=True)
+            text = job.render()
+            position = self.jobs.queue_position(job)
+            if position:
+                text += f"\nQueue position: {position}"
+            return await interaction.response.send_message(text, ephemeral=True)
 
-        # Counters for summary
-        counts = {
-            "system": 0,
-            "planet": 0,
-            "flora": 0,
-            "fauna": 0,
-            "archaeology": 0,
-            "mineral": 0
-        }
+        jobs = self.jobs.jobs_for_guild(interaction.guild_id)
+        if not jobs:
+            return await interaction.response.send_message("No collection jobs in this server.", ephemeral=True)
+        lines = [
+            f"#{j.id} <#{j.channel.id}> - {j.state}, {j.scanned} messages scanned"
+            for j in jobs[-15:]
+        ]
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    @app_commands.command(
+        name="collect_cancel",
+        description="Cancel a queued or running collection job."
+    )
+    @app_commands.describe(job_id="Job number returned by /collect_entry")
+    async def collect_cancel(self, interaction: discord.Interaction, job_id: int):
+        job = self.jobs.get(job_id)
+        if job is None or job.guild_id != interaction.guild_id:
+            return await interaction.response.send_message(f"No job #{job_id} found.", ephemeral=True)
+
+        perms = interaction.permissions
+        moderator = bool(perms and perms.manage_messages)
+        if interaction.user.id not in job.requesters and not moderator:
+            return await interaction.response.send_message(
+                "Only a user who requested this job or a moderator can cancel it.",
+                ephemeral=True
+            )
+
+        # A shared job keeps running while anyone else is still waiting on it
+        if not moderator and not job.finished and self.jobs.detach(job_id, interaction.user.id):
+            return await interaction.response.send_message(
+                f"Detached from job #{job_id}; it keeps running for the other requesters.",
+                ephemeral=True
+            )
 
-        # Process each message
-        for msg in messages:
-            text = msg.content or ""
-            entry_type = detect_template_type(text)
+        if not self.jobs.cancel(job_id):
+            return await interaction.response.send_message(f"Job #{job_id} has already finished.", ephemeral=True)
+        await interaction.response.send_message(f"Cancelling job #{job_id}.", ephemeral=True)
 
-            if not entry_type:
-                continue  # skip non-template messages
+    @app_commands.command(
+        name="search",
+        description="Search all collected entries by name, notes, descriptions, resources and more."
+    )
+    @app_commands.describe(query="Words to search for", entry_type="Only return entries of this type")
+    @app_commands.choices(entry_type=ENTRY_TYPE_CHOICES)
+    @app_commands.guild_only()
+    async def search(
+        self,
+        interaction: discord.Interaction,
+        query: str,
+        entry_type: Optional[app_commands.Choice[str]] = None
+    ):
+        import search_index
 
-            # Route to correct parser
-            if entry_type == "system":
-                parsed = parse_system_entry(msg)
-                counts["system"] += 1
+        # The index may be loading or mid-update; don't race the 3 s interaction deadline
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        hits = await _run_blocking(
+            search_index.search, query, interaction.guild_id,
+            entry_type=entry_type.value if entry_type else None, limit=SEARCH_RESULTS
+        )
+        if not hits:
+            return await interaction.followup.send(f"No entries match `{query}`.", ephemeral=True)
 
-            elif entry_type == "planet":
-                parsed = parse_planet_entry(msg)
-                counts["planet"] += 1
+        lines = [f"Top {len(hits)} results for `{query}`:"]
+        for hit in hits:
+            link = f"https://discord.com/channels/{interaction.guild_id}/{hit.thread_id}/{hit.message_id}"
+            lines.append(f"- **{hit.name or 'Unnamed'}** ({hit.entry_type}) - {link}")
+        await interaction.followup.send("\n".join(lines), ephemeral=True)
 
-            elif entry_type == "flora":
-                parsed = parse_flora_entry(msg)
-                counts["flora"] += 1
+    @app_commands.command(
+        name="stats",
+        description="Show aggregate statistics over every collected entry."
+    )
+    @app_commands.describe(dimension="Which breakdown to show (default: all)", top="How many rows per breakdown")
+    @app_commands.choices(dimension=STATS_DIMENSION_CHOICES)
+    @app_commands.guild_only()
+    async def stats(
+        self,
+        interaction: discord.Interaction,
+        dimension: Optional[app_commands.Choice[str]] = None,
+        top: app_commands.Range[int, 1, 50] = STATS_TOP
+    ):
+        import stats
 
-            elif entry_type == "fauna":
-                parsed = parse_fauna_entry(msg)
-                counts["fauna"] += 1
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        summary = await _run_blocking(lambda: stats.get_stats().summary(interaction.guild_id, top=top))
+        if dimension:
+            summary = {dimension.value: summary[dimension.value]}
 
-            elif entry_type == "archaeology":
-                parsed = parse_archaeology_entry(msg)
-                counts["archaeology"] += 1
+        lines = []
+        for dim, counts in summary.items():
+            lines.append(f"**{dim.replace('_', ' ').capitalize()}**")
+            if not counts:
+                lines.append("- none")
+            for label, count in counts.items():
+                lines.append(f"- {label}: {count}")
+        await interaction.followup.send("\n".join(lines)[:2000], ephemeral=True)
 
-            elif entry_type == "mineral":
-                parsed = parse_mineral_entry(msg)
-                counts["mineral"] += 1
+    @app_commands.command(
+        name="nearest",
+        description="List the catalogued entries closest to a glyph address or galactic coordinates."
+    )
+    @app_commands.describe(
+        address="12 glyph hex digits or XXXX:YYYY:ZZZZ:SSSS coordinates",
+        entry_type="Only return entries of this type",
+        count="How many entries to list"
+    )
+    @app_commands.choices(entry_type=ENTRY_TYPE_CHOICES)
+    @app_commands.guild_only()
+    async def nearest(
+        self,
+        interaction: discord.Interaction,
+        address: str,
+        entry_type: Optional[app_commands.Choice[str]] = None,
+        count: app_commands.Range[int, 1, 25] = NEAREST_RESULTS
+    ):
+        import galaxy
 
-            else:
-                continue
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            hits = await _run_blocking(
+                galaxy.nearest, address, interaction.guild_id, k=count,
+                entry_type=entry_type.value if entry_type else None
+            )
+        except ValueError:
+            return await interaction.followup.send(
+                f"`{address}` is not a glyph address or galactic coordinates.", ephemeral=True
+            )
+        if not hits:
+            return await interaction.followup.send("No catalogued entries have an address yet.", ephemeral=True)
+
+        lines = [f"Closest {len(hits)} entries to `{address}`:"]
+        lines.extend(self._galaxy_line(interaction, hit) for hit in hits)
+        await interaction.followup.send("\n".join(lines)[:2000], ephemeral=True)
 
-            parsed_entries.append(parsed)
+    @app_commands.command(
+        name="within",
+        description="List catalogued entries within a number of regions of an address."
+    )
+    @app_commands.describe(
+        address="12 glyph hex digits or XXXX:YYYY:ZZZZ:SSSS coordinates",
+        regions="Search radius in regions",
+        entry_type="Only return entries of this type"
+    )
+    @app_commands.choices(entry_type=ENTRY_TYPE_CHOICES)
+    @app_commands.guild_only()
+    async def within(
+        self,
+        interaction: discord.Interaction,
+        address: str,
+        regions: app_commands.Range[float, 0, 4096],
+        entry_type: Optional[app_commands.Choice[str]] = None
+    ):
+        import galaxy
 
-        # Export to JSON
-        export_filename = f"thread_{channel.id}_export.json"
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            hits = await _run_blocking(
+                galaxy.within, address, regions, interaction.guild_id,
+                entry_type=entry_type.value if entry_type else None
+            )
+        except ValueError:
+            return await interaction.followup.send(
+                f"`{address}` is not a glyph address or galactic coordinates.", ephemeral=True
+            )
+        if not hits:
+            return await interaction.followup.send(
+                f"No catalogued entries within {regions:g} regions of `{address}`.", ephemeral=True
+            )
 
-        with open(export_filename, "w", encoding="utf-8") as f:
-            json.dump(parsed_entries, f, indent=4)
+        lines = [f"{len(hits)} entries within {regions:g} regions of `{address}`:"]
+        lines.extend(self._galaxy_line(interaction, hit) for hit in hits[:WITHIN_LISTED])
+        if len(hits) > WITHIN_LISTED:
+            lines.append(f"- ...and {len(hits) - WITHIN_LISTED} more")
+        await interaction.followup.send("\n".join(lines)[:2000], ephemeral=True)
+
+    @staticmethod
+    def _galaxy_line(interaction: discord.Interaction, hit) -> str:
+        link = f"https://discord.com/channels/{interaction.guild_id}/{hit.thread_id}/{hit.message_id}"
+        return (f"- **{hit.name or 'Unnamed'}** ({hit.entry_type}) `{hit.address.glyphs()}` "
+                f"{hit.distance:.1f} regions - {link}")
+
+    # -----------------------------
+    # Job plumbing
+    # -----------------------------
+    async def _status_ticker(self, job):
+        while True:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=STATUS_EDIT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if job.status_message is not None:
+                try:
+                    await job.status_message.edit(content=job.render())
+                except discord.HTTPException as e:
+                    print(f"[JOB {job.id}] status edit failed:", e)
+            if job.finished:
+                return
+
+    async def _run_collection(self, job):
+        # Sample the loop for the whole run: first-use imports, the export
+        # write and the index updates can stall it as much as parsing can
+        lag = LoopLagMonitor()
+        try:
+            async with lag:
+                await self._collect(job, lag)
+        finally:
+            job.loop_lag = lag.worst
+            print(f"[JOB {job.id}] {job.scanned} messages, worst event-loop stall {lag.worst * 1000:.1f} ms")
+
+    async def _collect(self, job, lag):
+        # Loaded on first use; these pull in the parsers, the encoders and NumPy
+        import dispatcher
+        import exporter
+        import templates
+        from records import Quarantined
+
+        channel = job.channel
+
+        parsed_entries = []
+        # Search terms per entry, tokenized by the parse workers
+        parsed_terms = []
+
+        # Counters for summary
+        counts = job.counts
+
+        # Opt-in: stream entries to the dispatcher endpoints as they are parsed.
+        # put() blocks while the endpoint is behind, which slows the history fetch.
+        shipper = dispatcher.DispatchPipeline() if job.dispatch else None
+        job.dispatcher = shipper
+
+        async def accept(results):
+            for parsed, terms in results:
+                if isinstance(parsed, Quarantined):
+                    job.quarantined.append(parsed)
+                    print(f"[JOB {job.id}] quarantined message {parsed.message_id}: {parsed.reason}")
+                    continue
+                counts[parsed.entry_type] += 1
+                parsed_entries.append(parsed)
+                parsed_terms.append(terms)
+                if shipper is not None:
+                    await shipper.put(parsed)
+
+        # Fetch ALL messages in the thread (several snowflake windows at once);
+        # parsing runs in chunks on the worker executor so the gateway
+        # heartbeat is never starved.
+        # The guild's templates are fixed for the whole run, even if the file is reloaded meanwhile
+        pipeline = ParsePipeline(templates.get_registry().get(job.guild_id))
+        try:
+            if shipper is not None:
+                await shipper.start()
+            async for msg in fetch_history(channel):
+                if job.cancelled:
+                    job.summary = f"Cancelled after {job.scanned} messages; nothing was exported."
+                    if shipper is not None:
+                        job.summary += f" Dispatched before cancelling: {shipper.progress()}."
+                    return
+                job.scanned += 1
+                await accept(await pipeline.feed(msg))
+            await accept(await pipeline.flush())
+            if shipper is not None:
+                await shipper.close()
+        finally:
+            pipeline.cancel()
+            if shipper is not None:
+                await shipper.abort()
+
+        # Export to JSON, then fold the committed entries into the search
+        # index, running stats and the spatial index. Both take seconds on a
+        # big thread, so they run on an executor thread, not the event loop.
+        export_filename = exporter.export_filename(channel.id)
+        await _run_blocking(exporter.write_export, export_filename, parsed_entries)
+        await _run_blocking(_update_indexes, job.guild_id, channel.id, parsed_entries, parsed_terms)
 
         # Build summary message
         summary_lines = []
@@ -101,6 +439,9 @@ class Collector(commands.Cog):
             if value > 0:
                 summary_lines.append(f"- {key.capitalize()}: {value}")
 
+        if job.quarantined:
+            summary_lines.append(f"- Quarantined: {len(job.quarantined)}")
+
         if not summary_lines:
             summary = "No valid templates were found in this thread."
         else:
@@ -109,5 +450,17 @@ class Collector(commands.Cog):
                 + "\n".join(summary_lines)
                 + f"\n\nExported to `{export_filename}`"
             )
+        if shipper is not None:
+            summary += "\n\nDispatched to the collector:\n" + (
+                "\n".join(shipper.summary_lines()) or "- nothing to send"
+            )
+        if job.quarantined:
+            summary += "\n\nQuarantined messages (not parsed):\n" + "\n".join(
+                f"- https://discord.com/channels/{job.guild_id}/{q.thread_id}/{q.message_id}: {q.reason}"
+                for q in job.quarantined[:QUARANTINE_LISTED]
+            )
+            if len(job.quarantined) > QUARANTINE_LISTED:
+                summary += f"\n- ...and {len(job.quarantined) - QUARANTINE_LISTED} more"
+        summary += f"\nWorst event-loop stall: {lag.worst * 1000:.0f} ms"
 
-        await interaction.followup.send(summary, ephemeral=True)
\ No newline at end of file
+        job.summary = summary
@@ -1,46 +1,252 @@
 import aiohttp
 import asyncio
+import os
+import random
+from collections import Counter
+from typing import Optional
+
+import records
 
 BASE_URL = "https://example.com/collector"  # replace with URL
 TIMEOUT = aiohttp.ClientTimeout(total=15)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Streaming dispatch (see DispatchPipeline)
+DISPATCH_CONCURRENCY = int(os.getenv("VHC_DISPATCH_CONCURRENCY", "8"))
+DISPATCH_BATCH_SIZE = int(os.getenv("VHC_DISPATCH_BATCH", "25"))
+DISPATCH_QUEUE_SIZE = int(os.getenv("VHC_DISPATCH_QUEUE", "200"))
+DISPATCH_RETRIES = int(os.getenv("VHC_DISPATCH_RETRIES", "3"))
+DISPATCH_BACKOFF = 0.5   # seconds before the first retry; doubles per attempt
+DISPATCH_MAX_RETRY_AFTER = 60.0  # cap on a server-sent Retry-After
+DISPATCH_LINGER = 0.25   # flush partial batches after this long without new entries
+
+
+def _retry_after(resp) -> Optional[float]:
+    """Retry-After in seconds, if the response sent one we can read."""
+    try:
+        return min(max(float(resp.headers["Retry-After"]), 0.0), DISPATCH_MAX_RETRY_AFTER)
+    except (KeyError, ValueError):
+        return None
 
 
-async def _post(path: str, payload: dict):
+async def _post_once(session: aiohttp.ClientSession, path: str, payload):
+    """One POST, no logging: (ok, status, text, retry_after)."""
+    # payload may be a typed record or a plain dict; both go through the fast encoder
+    body = records.dumps(payload)
+    try:
+        async with session.post(f"{BASE_URL}/{path}", data=body, headers=JSON_HEADERS) as resp:
+            text = await resp.text()
+            return 200 <= resp.status < 300, resp.status, text, _retry_after(resp)
+    except Exception as e:
+        return False, None, str(e), None
+
+
+async def _post(path: str, payload, session: Optional[aiohttp.ClientSession] = None):
+    if session is None:
+        async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+            return await _post(path, payload, session)
+
     url = f"{BASE_URL}/{path}"
-    async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
-        try:
-            async with session.post(url, json=payload) as resp:
-                text = await resp.text()
-                if resp.status >= 200 and resp.status < 300:
-                    print(f"[OK] POST {url} status={resp.status}")
-                    return True, resp.status, text
-                else:
-                    print(f"[ERROR] POST {url} status={resp.status} body={text}")
-                    return False, resp.status, text
-        except Exception as e:
-            print(f"[EXCEPTION] POST {url} error={e}")
-            return False, None, str(e)
+    ok, status, text, _ = await _post_once(session, path, payload)
+    if ok:
+        print(f"[OK] POST {url} status={status}")
+    elif status is not None:
+        print(f"[ERROR] POST {url} status={status} body={text}")
+    else:
+        print(f"[EXCEPTION] POST {url} error={text}")
+    return ok, status, text
 
 
-async def send_system(data: dict):
+async def send_system(data):
     return await _post("system", data)
 
 
-async def send_planet(data: dict):
+async def send_planet(data):
     return await _post("planet", data)
 
 
-async def send_flora(data: dict):
+async def send_flora(data):
     return await _post("flora", data)
 
 
-async def send_fauna(data: dict):
+async def send_fauna(data):
     return await _post("fauna", data)
 
 
-async def send_archaeology(data: dict):
+async def send_archaeology(data):
     return await _post("archaeology", data)
 
 
-async def send_mineral(data: dict):
-    return await _post("mineral", data)
\ No newline at end of file
+async def send_mineral(data):
+    return await _post("mineral", data)
+
+# -----------------------------
+# Streaming dispatch
+# -----------------------------
+_CLOSE = object()
+
+
+class DispatchPipeline:
+    """
+    Sends entries to their type's endpoint while a collection is running.
+
+    put() hands an entry to a bounded queue; a single consumer groups
+    entries into per-type micro-batches and flushes each batch as
+    concurrent POSTs over one pooled session, at most `concurrency` in
+    flight. When the endpoint lags, in-flight slots stay taken, the
+    consumer stops draining, the queue fills and put() blocks, which
+    throttles whoever is feeding it (the history fetch). Network errors,
+    429 and 5xx responses are retried after the server's Retry-After, or
+    with jittered exponential backoff; a retrying POST gives up its slot
+    while it waits. A Retry-After also holds back new POSTs until it runs
+    out, so the backpressure still reaches the feeder. Only entries that
+    fail for good are logged.
+
+        async with DispatchPipeline() as shipper:
+            await shipper.put(entry)
+        shipper.sent, shipper.failed, shipper.retried  # Counters per type
+    """
+
+    def __init__(self, concurrency: int = DISPATCH_CONCURRENCY, batch_size: int = DISPATCH_BATCH_SIZE,
+                 queue_size: int = DISPATCH_QUEUE_SIZE, retries: int = DISPATCH_RETRIES):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.retries = max(0, retries)
+        self.sent = Counter()
+        self.failed = Counter()
+        self.retried = Counter()
+        self._queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._hold_until = 0.0
+        self._batches = {}
+        self._sending = set()
+        self._session = None
+        self._consumer = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.abort()
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(
+            timeout=TIMEOUT, connector=aiohttp.TCPConnector(limit=self.concurrency)
+        )
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def put(self, entry):
+        if self._consumer.done():
+            # Surface a crashed consumer instead of blocking on a full queue forever
+            self._consumer.result()
+        await self._queue.put(entry)
+
+    async def close(self):
+        """Send everything still queued or batched, then release the session."""
+        if self._consumer is not None:
+            await self._queue.put(_CLOSE)
+            await self._consumer
+            self._consumer = None
+        await self._close_session()
+
+    async def abort(self):
+        """Drop whatever has not been sent yet (run cancelled or failed)."""
+        tasks = list(self._sending)
+        if self._consumer is not None:
+            tasks.append(self._consumer)
+            self._consumer = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._close_session()
+
+    async def _close_session(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ---- consumer ----
+    async def _consume(self):
+        while True:
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), timeout=DISPATCH_LINGER)
+            except asyncio.TimeoutError:
+                # Quiet period; don't let partial batches sit around
+                for entry_type in list(self._batches):
+                    await self._flush(entry_type)
+                continue
+            if entry is _CLOSE:
+                break
+            batch = self._batches.setdefault(entry.entry_type, [])
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                await self._flush(entry.entry_type)
+
+        for entry_type in list(self._batches):
+            await self._flush(entry_type)
+        if self._sending:
+            await asyncio.gather(*self._sending)
+
+    async def _hold(self):
+        """Wait out the latest Retry-After before starting another POST."""
+        delay = self._hold_until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _flush(self, entry_type: str):
+        for entry in self._batches.pop(entry_type, ()):
+            # Blocks while `concurrency` POSTs are in flight; this is the backpressure
+            await self._hold()
+            await self._slots.acquire()
+            task = asyncio.create_task(self._send(entry_type, entry))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, entry_type: str, entry):
+        # _flush took a slot for us; it is handed back while backing off
+        held = True
+        try:
+            for attempt in range(self.retries + 1):
+                ok, status, text, retry_after = await _post_once(self._session, entry_type, entry)
+                if ok:
+                    self.sent[entry_type] += 1
+                    return
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt == self.retries:
+                    self.failed[entry_type] += 1
+                    print(f"[ERROR] POST {BASE_URL}/{entry_type} message={entry.meta.message_id} "
+                          f"status={status} attempts={attempt + 1} body={text[:200]}")
+                    return
+                self.retried[entry_type] += 1
+                if retry_after is not None:
+                    loop = asyncio.get_running_loop()
+                    self._hold_until = max(self._hold_until, loop.time() + retry_after)
+                    delay = retry_after
+                else:
+                    delay = DISPATCH_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                self._slots.release()
+                held = False
+                await asyncio.sleep(delay)
+                await self._slots.acquire()
+                held = True
+        finally:
+            if held:
+                self._slots.release()
+
+    # ---- reporting ----
+    def progress(self) -> str:
+        line = f"{sum(self.sent.values())} sent"
+        if self.failed:
+            line += f", {sum(self.failed.values())} failed"
+        if self.retried:
+            line += f", {sum(self.retried.values())} retried"
+        return line
+
+    def summary_lines(self):
+        for entry_type in sorted(set(self.sent) | set(self.failed) | set(self.retried)):
+            yield (f"- {entry_type.capitalize()}: {self.sent[entry_type]} sent, "
+                   f"{self.failed[entry_type]} failed, {self.retried[entry_type]} retried")
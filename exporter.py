@@ -0,0 +1,210 @@
+import json
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional
+
+import records
+
+
+# Sidecar index: header, then one fixed-size slot per entry sorted by
+# (message_id, offset) so point lookups can binary-search the mmap directly.
+INDEX_MAGIC = b"VHCIDX1\0"
+INDEX_HEADER = struct.Struct("<8sQ")    # magic, slot count
+INDEX_SLOT = struct.Struct("<QBQI")     # message_id, type code, byte offset, byte length
+TYPE_CODES = {t: n for n, t in enumerate(records.ENTRY_CLASSES)}
+TYPE_NAMES = list(records.ENTRY_CLASSES)
+
+
+def export_filename(thread_id: int) -> str:
+    return f"thread_{thread_id}_export.json"
+
+
+def index_filename(export_path: str) -> str:
+    base, _ = os.path.splitext(export_path)
+    return base + ".idx"
+
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def _write_index(path: str, slots: list):
+    slots.sort(key=lambda s: (s[0], s[2]))
+    idx_path = index_filename(path)
+    tmp = _tmp_path(idx_path)
+    with open(tmp, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(slots)))
+        for slot in slots:
+            f.write(INDEX_SLOT.pack(*slot))
+    os.replace(tmp, idx_path)
+
+
+def write_export(path: str, entries: list):
+    """
+    Write entries as a JSON array with one compact record per line. The file
+    is still plain JSON (json.load reads it) but encodes much faster than
+    an indented dump and stays greppable. A binary sidecar (<name>.idx) maps
+    each record's message id and type to its byte range, for ExportReader.
+
+    Both files are written to temp names and renamed into place (data
+    first, so a fresh index is never older than its export), so readers
+    and concurrent writers never see a half-written file.
+    """
+    slots = []
+    tmp = _tmp_path(path)
+    with open(tmp, "wb") as f:
+        f.write(b"[\n")
+        offset = 2
+        for n, entry in enumerate(entries):
+            if n:
+                f.write(b",\n")
+                offset += 2
+            data = records.dumps(entry)
+            f.write(data)
+            slots.append((entry.meta.message_id, TYPE_CODES[entry.entry_type], offset, len(data)))
+            offset += len(data)
+        f.write(b"\n]\n")
+    os.replace(tmp, path)
+    _write_index(path, slots)
+
+
+def read_export(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [records.from_dict(e) for e in json.load(f)]
+
+
+def _indented_slots(path: str) -> list:
+    """
+    Slots for an older indented export, left as it is on disk: each array
+    element is decoded in turn and its span converted to byte offsets.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    slots = []
+    pos = text.index("[") + 1
+    char, byte = 0, 0
+    while True:
+        while text[pos] in " \t\r\n,":
+            pos += 1
+        if text[pos] == "]":
+            return slots
+        entry, end = decoder.raw_decode(text, pos)
+        byte += len(text[char:pos].encode("utf-8"))
+        length = len(text[pos:end].encode("utf-8"))
+        slots.append((entry["meta"]["message_id"], TYPE_CODES[entry["entry_type"]], byte, length))
+        char, byte, pos = end, byte + length, end
+
+
+def build_index(path: str):
+    """
+    (Re)build the sidecar for an export. Line-per-record exports are scanned
+    as a stream; older indented exports are indexed where they are, without
+    being rewritten (the reader only needs byte ranges).
+    """
+    slots = []
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            start = offset
+            offset += len(line)
+            body = line.rstrip(b"\r\n")
+            if body.endswith(b","):
+                body = body[:-1]
+            if not body.lstrip().startswith(b"{"):
+                continue
+            try:
+                entry = json.loads(body)
+            except ValueError:
+                slots = _indented_slots(path)
+                break
+            slots.append((entry["meta"]["message_id"], TYPE_CODES[entry["entry_type"]], start, len(body)))
+    _write_index(path, slots)
+
+
+# -----------------------------
+# Random access reader
+# -----------------------------
+class ExportReader:
+    """
+    Memory-mapped access to one export through its sidecar index. Only the
+    requested records are decoded, so lookups and type scans run in
+    constant memory whatever the file size.
+
+        with ExportReader("thread_123_export.json") as export:
+            export.get(1465242706816270482)
+            for planet in export.iter_type("planet"):
+                ...
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        idx_path = index_filename(path)
+        if not os.path.exists(idx_path) or os.path.getmtime(idx_path) < os.path.getmtime(path):
+            build_index(path)
+        self._data_file = open(path, "rb")
+        self._idx_file = open(idx_path, "rb")
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._idx = mmap.mmap(self._idx_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = INDEX_HEADER.unpack_from(self._idx, 0)
+        if magic != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{idx_path} is not an export index")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for handle in ("_data", "_idx", "_data_file", "_idx_file"):
+            obj = getattr(self, handle, None)
+            if obj is not None:
+                obj.close()
+                setattr(self, handle, None)
+
+    def _slot(self, n: int):
+        return INDEX_SLOT.unpack_from(self._idx, INDEX_HEADER.size + n * INDEX_SLOT.size)
+
+    def _decode(self, offset: int, length: int, raw: bool):
+        entry = json.loads(self._data[offset:offset + length])
+        return entry if raw else records.from_dict(entry)
+
+    def _lower_bound(self, message_id: int) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._slot(mid)[0] < message_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, message_id: int, entry_type: Optional[str] = None, raw: bool = False) -> List:
+        """All records parsed from one message (optionally of one type)."""
+        found = []
+        n = self._lower_bound(message_id)
+        while n < self._count:
+            mid, code, offset, length = self._slot(n)
+            if mid != message_id:
+                break
+            if entry_type is None or TYPE_NAMES[code] == entry_type:
+                found.append(self._decode(offset, length, raw))
+            n += 1
+        return found
+
+    def iter_type(self, entry_type: Optional[str] = None, raw: bool = False) -> Iterator:
+        """Stream records (all, or one type) in message id order."""
+        wanted = None if entry_type is None else TYPE_CODES[entry_type]
+        for n in range(self._count):
+            _, code, offset, length = self._slot(n)
+            if wanted is None or code == wanted:
+                yield self._decode(offset, length, raw)
+
+    def __iter__(self):
+        return self.iter_type()
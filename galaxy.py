@@ -0,0 +1,399 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+
+GALAXY_PATH = os.getenv("VHC_GALAXY_INDEX", "galaxy_index.npz")
+# Grid cell edge in regions (voxels). Radius queries only visit the cells a
+# query box overlaps, so this trades cell count against points per cell.
+CELL_SIZE = 32
+# Past the galaxy's extent (4096 x 256 x 4096 regions) nearest() stops widening
+MAX_RADIUS = 4096 * 2
+
+
+# -----------------------------
+# Address decoding
+# -----------------------------
+class Address(NamedTuple):
+    """Voxel (region) coordinates plus the system and planet inside it."""
+    x: int
+    y: int
+    z: int
+    system: int
+    planet: int
+
+    def glyphs(self) -> str:
+        """Portal address, P SSS YY ZZZ XXX, as 12 hex digits."""
+        return (f"{self.planet:X}{self.system:03X}{self.y & 0xFF:02X}"
+                f"{self.z & 0xFFF:03X}{self.x & 0xFFF:03X}")
+
+    def coordinates(self) -> str:
+        """Galactic coordinates as shown on the signal booster, XXXX:YYYY:ZZZZ:SSSS."""
+        return f"{self.x + 0x7FF:04X}:{self.y + 0x7F:04X}:{self.z + 0x7FF:04X}:{self.system:04X}"
+
+
+_COORDS_RE = re.compile(r"([0-9A-Fa-f]{4}):([0-9A-Fa-f]{4}):([0-9A-Fa-f]{4}):([0-9A-Fa-f]{4})")
+_GLYPHS_RE = re.compile(r"(?<![0-9A-Fa-f])[0-9A-Fa-f]{12}(?![0-9A-Fa-f])")
+
+
+def _signed(value: int, bits: int) -> int:
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+
+def decode_glyphs(text: Optional[str]) -> Optional[Address]:
+    """12 glyph hex digits (P SSS YY ZZZ XXX) -> Address; None if absent."""
+    if not text:
+        return None
+    m = _GLYPHS_RE.search(text)
+    if not m:
+        return None
+    h = m.group(0)
+    return Address(
+        x=_signed(int(h[9:12], 16), 12),
+        y=_signed(int(h[4:6], 16), 8),
+        z=_signed(int(h[6:9], 16), 12),
+        system=int(h[1:4], 16),
+        planet=int(h[0], 16),
+    )
+
+
+def decode_coordinates(text: Optional[str]) -> Optional[Address]:
+    """Signal-booster coordinates (XXXX:YYYY:ZZZZ:SSSS) -> Address; None if absent."""
+    if not text:
+        return None
+    m = _COORDS_RE.search(text)
+    if not m:
+        return None
+    x, y, z, system = (int(g, 16) for g in m.groups())
+    if x > 0xFFF or y > 0xFF or z > 0xFFF or system > 0xFFF:
+        return None
+    return Address(x - 0x7FF, y - 0x7F, z - 0x7FF, system, 0)
+
+
+def decode_address(text: Optional[str]) -> Optional[Address]:
+    """Either form; galactic coordinates win when both appear."""
+    return decode_coordinates(text) or decode_glyphs(text)
+
+
+# Record fields to try, most specific first
+ADDRESS_FIELDS = {
+    "system": ("coordinates", "code_hex"),
+    "planet": ("glyphs_hex", "glyphs_raw"),
+    "flora": ("coordinates",),
+    "fauna": ("coordinates",),
+    "archaeology": ("coordinates",),
+    "mineral": ("coordinates",),
+}
+
+
+def record_address(record) -> Optional[Address]:
+    for field in ADDRESS_FIELDS.get(record.entry_type, ()):
+        address = decode_address(getattr(record, field, None))
+        if address is not None:
+            return address
+    return None
+
+
+# -----------------------------
+# Spatial index
+# -----------------------------
+class GalaxyHit:
+    __slots__ = ("key", "distance", "entry_type", "name", "address", "thread_id", "message_id")
+
+    def __init__(self, key, distance, entry_type, name, address, thread_id, message_id):
+        self.key = key
+        self.distance = distance
+        self.entry_type = entry_type
+        self.name = name
+        self.address = address
+        self.thread_id = thread_id
+        self.message_id = message_id
+
+    def __repr__(self):
+        return f"GalaxyHit({self.entry_type} {self.name!r} distance={self.distance:.1f})"
+
+
+class GalaxyIndex:
+    """
+    Decoded addresses of committed entries in NumPy columns (one row per
+    entry), bucketed into a uniform grid of CELL_SIZE-region cells.
+
+    add() appends a row and drops it into its cell, so the index grows
+    incrementally; an entry re-collected under the same key with a different
+    row, or missing when its thread is collected again, retires its old row,
+    and dead rows are compacted away once they outnumber live ones. Radius queries
+    gather candidate rows from the overlapped cells and filter them to one
+    guild with one vectorised distance check; nearest() widens a radius
+    query until it holds k rows. Distances are in regions. Collections
+    update the index from an executor thread, so the public methods hold
+    `lock`.
+    """
+
+    COLUMNS = {
+        "xyz": (np.int16, (3,)),
+        "system": (np.int16, ()),
+        "planet": (np.int8, ()),
+        "entry_type": (np.int8, ()),
+        "guild_id": (np.int64, ()),
+        "thread_id": (np.int64, ()),
+        "message_id": (np.int64, ()),
+        "alive": (np.bool_, ()),
+    }
+
+    def __init__(self, path: str = GALAXY_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.types: List[str] = []
+        self.names: List[Optional[str]] = []
+        self.row_keys: List[str] = []
+        self.keys: Dict[str, int] = {}
+        self.threads: Dict[int, set] = {}
+        self.size = 0
+        self._cols = {name: np.empty((64,) + shape, dtype=dtype) for name, (dtype, shape) in self.COLUMNS.items()}
+        self._cells: Dict[tuple, List[int]] = {}
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _col(self, name: str):
+        return self._cols[name][:self.size]
+
+    @staticmethod
+    def _cell(x: int, y: int, z: int) -> tuple:
+        return (x // CELL_SIZE, y // CELL_SIZE, z // CELL_SIZE)
+
+    def _type_code(self, entry_type: str) -> int:
+        if entry_type not in self.types:
+            self.types.append(entry_type)
+        return self.types.index(entry_type)
+
+    # ---- updates ----
+    def _retire(self, key: str):
+        row = self.keys.pop(key, None)
+        if row is None:
+            return
+        self._cols["alive"][row] = False
+        self._dirty = True
+        x, y, z = self._cols["xyz"][row].tolist()
+        self._cells[self._cell(x, y, z)].remove(row)
+        thread_id = int(self._cols["thread_id"][row])
+        keys = self.threads.get(thread_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.threads[thread_id]
+
+    def add(self, record, guild_id: int) -> bool:
+        """Index one record; False when it carries no decodable address."""
+        with self.lock:
+            return self._add(record, guild_id)
+
+    def retire_missing(self, thread_id: int, keep) -> int:
+        """Retire the rows of a re-collected thread whose key is not in `keep`."""
+        with self.lock:
+            stale = self.threads.get(thread_id, set()) - set(keep)
+            for key in stale:
+                self._retire(key)
+            return len(stale)
+
+    def _unchanged(self, row: Optional[int], address: Address, type_code: int, guild_id: int, record) -> bool:
+        if row is None or self.names[row] != getattr(record, "name", None):
+            return False
+        cols = self._cols
+        return (tuple(cols["xyz"][row].tolist()) == (address.x, address.y, address.z)
+                and cols["system"][row] == address.system and cols["planet"][row] == address.planet
+                and cols["entry_type"][row] == type_code and cols["guild_id"][row] == guild_id
+                and cols["thread_id"][row] == record.meta.thread_id
+                and cols["message_id"][row] == record.meta.message_id)
+
+    def _add(self, record, guild_id: int) -> bool:
+        address = record_address(record)
+        if address is None:
+            self._retire(record.key)
+            return False
+        type_code = self._type_code(record.entry_type)
+        if self._unchanged(self.keys.get(record.key), address, type_code, guild_id, record):
+            return True
+        self._retire(record.key)
+
+        if self.size == len(self._cols["alive"]):
+            for name, col in self._cols.items():
+                grown = np.empty((max(64, self.size * 2),) + col.shape[1:], dtype=col.dtype)
+                grown[:self.size] = col
+                self._cols[name] = grown
+        row = self.size
+        self.size += 1
+
+        cols = self._cols
+        cols["xyz"][row] = (address.x, address.y, address.z)
+        cols["system"][row] = address.system
+        cols["planet"][row] = address.planet
+        cols["entry_type"][row] = type_code
+        cols["guild_id"][row] = guild_id
+        cols["thread_id"][row] = record.meta.thread_id
+        cols["message_id"][row] = record.meta.message_id
+        cols["alive"][row] = True
+        self.names.append(getattr(record, "name", None))
+        self.row_keys.append(record.key)
+        self.keys[record.key] = row
+        self.threads.setdefault(record.meta.thread_id, set()).add(record.key)
+        self._cells.setdefault(self._cell(address.x, address.y, address.z), []).append(row)
+        self._dirty = True
+        return True
+
+    def _compact(self):
+        """Drop dead rows once they outnumber live ones."""
+        if self.size - len(self.keys) <= len(self.keys):
+            return
+        keep = np.flatnonzero(self._col("alive"))
+        self._cols = {name: self._col(name)[keep] for name in self.COLUMNS}
+        rows = keep.tolist()
+        self.names = [self.names[row] for row in rows]
+        self.row_keys = [self.row_keys[row] for row in rows]
+        self.keys = {key: row for row, key in enumerate(self.row_keys)}
+        self.size = len(rows)
+        self.rebuild_cells()
+
+    def rebuild_cells(self):
+        self._cells = {}
+        xyz = self._col("xyz")
+        cells = xyz // CELL_SIZE
+        for row in np.flatnonzero(self._col("alive")).tolist():
+            self._cells.setdefault(tuple(cells[row].tolist()), []).append(row)
+
+    # ---- queries ----
+    def _candidates(self, center: Address, radius: float) -> np.ndarray:
+        lo = self._cell(*(int(np.floor(c - radius)) for c in center[:3]))
+        hi = self._cell(*(int(np.ceil(c + radius)) for c in center[:3]))
+        span = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1)
+        if span >= len(self._cells):
+            # Box covers more cells than are occupied; walk the occupied ones
+            rows = [r for cell, members in self._cells.items()
+                    if all(lo[i] <= cell[i] <= hi[i] for i in range(3)) for r in members]
+        else:
+            rows = []
+            for cx in range(lo[0], hi[0] + 1):
+                for cy in range(lo[1], hi[1] + 1):
+                    for cz in range(lo[2], hi[2] + 1):
+                        rows.extend(self._cells.get((cx, cy, cz), ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def _query(self, center: Address, radius: float, guild_id: int, entry_type: Optional[str]):
+        rows = self._candidates(center, radius)
+        rows = rows[self._cols["guild_id"][rows] == guild_id]
+        if entry_type is not None:
+            if entry_type not in self.types:
+                return rows[:0], np.zeros(0)
+            rows = rows[self._cols["entry_type"][rows] == self.types.index(entry_type)]
+        delta = self._cols["xyz"][rows].astype(np.float64) - np.array(center[:3], dtype=np.float64)
+        dist = np.sqrt((delta * delta).sum(axis=1))
+        keep = dist <= radius
+        rows, dist = rows[keep], dist[keep]
+        # Same region: order by system index distance, then planet
+        system_gap = np.abs(self._cols["system"][rows].astype(np.int32) - center.system)
+        order = np.lexsort((self._cols["planet"][rows], system_gap, dist))
+        return rows[order], dist[order]
+
+    def _hits(self, rows, dist, limit: Optional[int]) -> List[GalaxyHit]:
+        cols = self._cols
+        hits = []
+        for row, d in zip(rows[:limit].tolist(), dist[:limit].tolist()):
+            x, y, z = cols["xyz"][row].tolist()
+            hits.append(GalaxyHit(
+                self.row_keys[row], d, self.types[cols["entry_type"][row]], self.names[row],
+                Address(x, y, z, int(cols["system"][row]), int(cols["planet"][row])),
+                int(cols["thread_id"][row]), int(cols["message_id"][row]),
+            ))
+        return hits
+
+    def within(self, center: Address, radius: float, guild_id: int, entry_type: Optional[str] = None,
+               limit: Optional[int] = None) -> List[GalaxyHit]:
+        with self.lock:
+            rows, dist = self._query(center, radius, guild_id, entry_type)
+            return self._hits(rows, dist, limit)
+
+    def nearest(self, center: Address, guild_id: int, k: int = 10,
+                entry_type: Optional[str] = None) -> List[GalaxyHit]:
+        with self.lock:
+            return self._nearest(center, guild_id, k, entry_type)
+
+    def _nearest(self, center: Address, guild_id: int, k: int, entry_type: Optional[str]) -> List[GalaxyHit]:
+        radius = float(CELL_SIZE)
+        while True:
+            rows, dist = self._query(center, radius, guild_id, entry_type)
+            # Anything closer than the k-th hit lies inside this radius already
+            if len(rows) >= k or radius >= MAX_RADIUS:
+                return self._hits(rows, dist, k)
+            radius *= 2
+
+    # ---- persistence ----
+    def save(self):
+        """Write the index if anything changed since it was loaded or last saved."""
+        # Collections in different guilds can finish together; they share the tmp path
+        tmp = self.path + ".tmp.npz"
+        with self.lock:
+            if not self._dirty and os.path.exists(self.path):
+                return
+            self._compact()
+            np.savez_compressed(
+                tmp,
+                **{name: self._col(name) for name in self.COLUMNS},
+                meta=np.array(json.dumps({"types": self.types, "names": self.names, "row_keys": self.row_keys})),
+            )
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with self.lock, np.load(self.path) as data:
+            for name in self.COLUMNS:
+                self._cols[name] = np.array(data[name])
+            meta = json.loads(str(data["meta"]))
+            self.size = len(self._cols["alive"])
+            self.types, self.names, self.row_keys = meta["types"], meta["names"], meta["row_keys"]
+            alive = self._col("alive")
+            self.keys = {key: row for row, key in enumerate(self.row_keys) if alive[row]}
+            self.threads = {}
+            thread_ids = self._col("thread_id").tolist()
+            for key, row in self.keys.items():
+                self.threads.setdefault(thread_ids[row], set()).add(key)
+            self.rebuild_cells()
+            self._compact()
+            self._dirty = False
+        return self
+
+
+_galaxy: Optional[GalaxyIndex] = None
+_galaxy_lock = threading.Lock()
+
+
+def get_galaxy() -> GalaxyIndex:
+    """Process-wide index, loaded from disk on first use (from any thread)."""
+    global _galaxy
+    with _galaxy_lock:
+        if _galaxy is None:
+            _galaxy = GalaxyIndex().load()
+    return _galaxy
+
+
+def nearest(address: str, guild_id: int, k: int = 10, entry_type: Optional[str] = None) -> List[GalaxyHit]:
+    """A guild's closest indexed entries to a glyph address or galactic coordinates."""
+    center = decode_address(address)
+    if center is None:
+        raise ValueError(f"not a glyph address or galactic coordinates: {address!r}")
+    return get_galaxy().nearest(center, guild_id, k, entry_type)
+
+
+def within(address: str, radius: float, guild_id: int, entry_type: Optional[str] = None,
+           limit: Optional[int] = None) -> List[GalaxyHit]:
+    """A guild's indexed entries at most `radius` regions from an address, closest first."""
+    center = decode_address(address)
+    if center is None:
+        raise ValueError(f"not a glyph address or galactic coordinates: {address!r}")
+    return get_galaxy().within(center, radius, guild_id, entry_type, limit)
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+import discord
+
+
+HISTORY_CONCURRENCY = int(os.getenv("VHC_HISTORY_CONCURRENCY", "4"))
+MESSAGES_PER_WINDOW = int(os.getenv("VHC_HISTORY_WINDOW_MESSAGES", "1000"))
+MAX_WINDOWS = 64
+# A gap this long between two messages of one window means discord.py sat
+# out a 429 (or the API is struggling); back off one concurrent window.
+STALL_SECONDS = float(os.getenv("VHC_HISTORY_STALL_SECONDS", "1.0"))
+# Messages each window may fetch ahead of the consumer before it waits
+WINDOW_BUFFER = int(os.getenv("VHC_HISTORY_WINDOW_BUFFER", "200"))
+
+_DONE = object()
+
+
+# -----------------------------
+# Window planning
+# -----------------------------
+def plan_windows(channel, concurrency: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split the thread's lifetime into snowflake ranges, newest first, as
+    (first id included, first id excluded) pairs. The newest window is
+    open-ended so messages posted mid-run (or a stale last_message_id) are
+    still covered.
+    """
+    start = channel.id  # a thread's id is minted when it is created
+    end = getattr(channel, "last_message_id", None)
+    if end is None or end <= start or concurrency <= 1:
+        return [(start, None)]
+
+    count = getattr(channel, "message_count", None)
+    if count:
+        n = -(-count // MESSAGES_PER_WINDOW)
+    else:
+        n = concurrency * 2
+    n = max(1, min(n, MAX_WINDOWS))
+    if n == 1:
+        return [(start, None)]
+
+    step = (end + 1 - start) / n
+    bounds = [start + int(step * k) for k in range(n)] + [None]
+    windows = [(bounds[k], bounds[k + 1]) for k in range(n) if bounds[k + 1] is None or bounds[k] < bounds[k + 1]]
+    windows.reverse()
+    return windows
+
+
+class _AdaptiveLimit:
+    """Semaphore whose size shrinks on stalls and recovers after clean windows."""
+
+    def __init__(self, limit: int):
+        self.max = max(1, limit)
+        self.limit = self.max
+        self.active = 0
+        self.stalls = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self, stalled: bool):
+        async with self._cond:
+            self.active -= 1
+            if stalled:
+                self.stalls += 1
+                self.limit = max(1, self.limit - 1)
+            elif self.limit < self.max:
+                self.limit += 1
+            self._cond.notify_all()
+
+
+# -----------------------------
+# Parallel fetch
+# -----------------------------
+async def fetch_history(channel, concurrency: Optional[int] = None) -> AsyncIterator[discord.Message]:
+    """
+    Drop-in for `channel.history(limit=None)`: yields every message newest
+    first, but pages up to `concurrency` snowflake windows at once. Windows
+    are fetched concurrently and replayed strictly in order, so callers
+    see the same sequence a serial fetch would produce, without duplicates.
+
+    Each window buffers at most WINDOW_BUFFER messages, so a slow consumer
+    holds the fetch back instead of the whole thread piling up in memory.
+    Windows take their fetch slots in order; the window being replayed
+    always holds one, so the windows ahead of it can't starve it.
+    """
+    concurrency = concurrency or HISTORY_CONCURRENCY
+    windows = plan_windows(channel, concurrency)
+    if len(windows) == 1:
+        async for msg in channel.history(limit=None):
+            yield msg
+        return
+
+    limit = _AdaptiveLimit(concurrency)
+    queues = [asyncio.Queue(maxsize=WINDOW_BUFFER) for _ in windows]
+
+    async def fetch_window(n: int, lo: int, hi: Optional[int]):
+        queue = queues[n]
+        stalled = False
+        try:
+            try:
+                last = time.monotonic()
+                async for msg in channel.history(
+                    limit=None,
+                    after=discord.Object(id=lo - 1),
+                    before=discord.Object(id=hi) if hi is not None else None,
+                    oldest_first=False,
+                ):
+                    if time.monotonic() - last > STALL_SECONDS:
+                        stalled = True
+                    await queue.put(msg)
+                    # Time spent waiting on the consumer is not a stall
+                    last = time.monotonic()
+            finally:
+                await limit.release(stalled)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(_DONE)
+
+    tasks = []
+
+    async def launch():
+        for n, (lo, hi) in enumerate(windows):
+            await limit.acquire()
+            tasks.append(asyncio.create_task(fetch_window(n, lo, hi)))
+
+    launcher = asyncio.create_task(launch())
+    previous = None
+    try:
+        for queue in queues:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                # Windows never overlap, but never yield an id twice or out of order
+                if previous is not None and item.id >= previous:
+                    continue
+                previous = item.id
+                yield item
+    finally:
+        launcher.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(launcher, *tasks, return_exceptions=True)
+        if limit.stalls:
+            print(f"[HISTORY] {channel.id}: {len(windows)} windows, {limit.stalls} stalled; "
+                  f"concurrency settled at {limit.limit}")
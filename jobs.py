@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+
+from singleflight import SingleFlight
+
+ENTRY_TYPES = ("system", "planet", "flora", "fauna", "archaeology", "mineral")
+
+MAX_WORKERS = int(os.getenv("VHC_COLLECT_WORKERS", "3"))
+MAX_JOBS_PER_GUILD = int(os.getenv("VHC_COLLECT_JOBS_PER_GUILD", "1"))
+STATUS_EDIT_INTERVAL = float(os.getenv("VHC_STATUS_EDIT_INTERVAL", "5"))
+# Repeat /collect_entry calls on a thread within this many seconds of a
+# finished run get that run's result instead of a new collection
+RESULT_TTL = float(os.getenv("VHC_RESULT_TTL", "60"))
+FINISHED_JOBS_KEPT = 100
+
+
+class JobConflict(Exception):
+    """The thread already has a run in flight that can't stand in for this request."""
+
+    def __init__(self, job: "Job"):
+        super().__init__(f"job #{job.id} is already collecting this thread")
+        self.job = job
+
+
+# -----------------------------
+# Job
+# -----------------------------
+class Job:
+    def __init__(self, job_id: int, guild_id: Optional[int], channel, requested_by: int, dispatch: bool = False):
+        self.id = job_id
+        self.guild_id = guild_id
+        self.channel = channel
+        self.requested_by = requested_by
+        self.requesters = {requested_by}
+        # Also send every entry to the dispatcher endpoints while collecting
+        self.dispatch = dispatch
+        self.dispatcher = None
+        self.state = "queued"  # queued -> running -> done | cancelled | failed
+        self.scanned = 0
+        # Threads created after mid-2022 report an approximate message count
+        self.total = getattr(channel, "message_count", None) or None
+        self.counts = {t: 0 for t in ENTRY_TYPES}
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.summary = None
+        self.error = None
+        self.loop_lag = 0.0
+        self.quarantined = []
+        self.status_message = None
+        self.done = asyncio.Event()
+        self._cancel_requested = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_requested
+
+    @property
+    def flight_key(self) -> int:
+        return self.channel.id
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "cancelled", "failed")
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or time.monotonic()
+        return end - self.started_at
+
+    def eta(self) -> Optional[float]:
+        if self.state != "running" or not self.total or not self.scanned:
+            return None
+        remaining = max(self.total - self.scanned, 0)
+        return self.elapsed() / self.scanned * remaining
+
+    def render(self) -> str:
+        lines = [f"**Collection job #{self.id}** in <#{self.channel.id}> - {self.state}"]
+
+        scanned = f"Messages scanned: {self.scanned}"
+        if self.total:
+            scanned += f" / ~{self.total}"
+        lines.append(scanned)
+
+        found = [f"{key.capitalize()}: {value}" for key, value in self.counts.items() if value > 0]
+        lines.append("Entries: " + (", ".join(found) if found else "none yet"))
+        if self.quarantined:
+            lines.append(f"Quarantined: {len(self.quarantined)}")
+        if self.dispatcher is not None:
+            lines.append("Dispatched: " + self.dispatcher.progress())
+
+        if self.state == "running":
+            eta = self.eta()
+            lines.append(f"Elapsed: {self.elapsed():.0f}s" + (f", ETA: ~{eta:.0f}s" if eta is not None else ""))
+        elif self.finished:
+            lines.append(f"Finished in {self.elapsed():.1f}s")
+
+        if self.summary:
+            lines.append("")
+            lines.append(self.summary)
+        if self.error:
+            lines.append(f"Error: {self.error}")
+        return "\n".join(lines)
+
+
+# -----------------------------
+# Job manager
+# -----------------------------
+class JobManager:
+    """
+    Bounded pool of asyncio workers running collection jobs.
+
+    Queued jobs are kept per guild and picked round-robin, and each guild
+    may only hold MAX_JOBS_PER_GUILD workers at once, so a guild with a
+    huge backlog cannot starve the others. Jobs are single-flight per
+    thread: submitting a thread that is already queued or running (or that
+    finished less than RESULT_TTL seconds ago) returns the existing job.
+    A dispatching run covers a plain request too; a dispatch request
+    raises JobConflict against a plain run still in flight, and replaces a
+    plain run that has already finished.
+    """
+
+    def __init__(self, runner, max_workers: int = MAX_WORKERS, per_guild: int = MAX_JOBS_PER_GUILD,
+                 result_ttl: float = RESULT_TTL):
+        self._runner = runner
+        self._flights = SingleFlight(result_ttl)
+        self._max_workers = max(1, max_workers)
+        self._per_guild = max(1, per_guild)
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._finished = deque()
+        self._queues = OrderedDict()
+        self._running = {}
+        self._workers = []
+        self._changed = asyncio.Event()
+
+    # ---- lifecycle ----
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        for n in range(self._max_workers):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"collect-worker-{n}"))
+
+    async def stop(self):
+        for job in self._jobs.values():
+            if not job.finished:
+                job.cancel()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # ---- public API ----
+    def submit(self, guild_id: Optional[int], channel, requested_by: int, dispatch: bool = False) -> Tuple[Job, bool]:
+        """Returns (job, attached); attached is True when an existing job was reused."""
+        existing = self._flights.get(channel.id)
+        if existing is not None:
+            if existing.dispatch or not dispatch:
+                existing.requesters.add(requested_by)
+                return existing, True
+            if not existing.finished:
+                raise JobConflict(existing)
+
+        self._ensure_workers()
+        job = Job(next(self._ids), guild_id, channel, requested_by, dispatch)
+        self._jobs[job.id] = job
+        self._flights.start(job.flight_key, job)
+        self._queues.setdefault(guild_id, deque()).append(job)
+        self._changed.set()
+        return job, False
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs_for_guild(self, guild_id: Optional[int]) -> list:
+        return [j for j in self._jobs.values() if j.guild_id == guild_id]
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        queue = self._queues.get(job.guild_id)
+        if job.state != "queued" or not queue or job not in queue:
+            return None
+        return list(queue).index(job) + 1
+
+    def detach(self, job_id: int, user_id: int) -> bool:
+        """Drop one requester from a shared job; False if they are the last one."""
+        job = self._jobs.get(job_id)
+        if job is None or user_id not in job.requesters or len(job.requesters) == 1:
+            return False
+        job.requesters.discard(user_id)
+        return True
+
+    def cancel(self, job_id: int) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel()
+        if job.state == "queued":
+            queue = self._queues.get(job.guild_id)
+            if queue and job in queue:
+                queue.remove(job)
+            self._finish(job, "cancelled")
+        return True
+
+    # ---- scheduling ----
+    def _next_job(self) -> Optional[Job]:
+        for guild_id in list(self._queues):
+            queue = self._queues[guild_id]
+            if not queue:
+                del self._queues[guild_id]
+                continue
+            if self._running.get(guild_id, 0) >= self._per_guild:
+                continue
+            job = queue.popleft()
+            # Rotate this guild to the back so the next pick serves someone else
+            self._queues.move_to_end(guild_id)
+            if not queue:
+                del self._queues[guild_id]
+            return job
+        return None
+
+    def _finish(self, job: Job, state: str):
+        job.state = state
+        job.finished_at = time.monotonic()
+        job.done.set()
+        # Only a complete run is worth handing to the next requester
+        self._flights.finish(job.flight_key, job, cache=state == "done")
+        self._finished.append(job.id)
+        while len(self._finished) > FINISHED_JOBS_KEPT:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    async def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            self._running[job.guild_id] = self._running.get(job.guild_id, 0) + 1
+            job.state = "running"
+            job.started_at = time.monotonic()
+            try:
+                await self._runner(job)
+            except asyncio.CancelledError:
+                self._finish(job, "cancelled")
+                raise
+            except Exception as e:
+                print(f"[JOB {job.id}] failed:", e)
+                job.error = str(e)
+                self._finish(job, "failed")
+            else:
+                self._finish(job, "cancelled" if job.cancelled else "done")
+            finally:
+                self._running[job.guild_id] -= 1
+                if not self._running[job.guild_id]:
+                    del self._running[job.guild_id]
+                self._changed.set()
@@ -0,0 +1,318 @@
+"""
+End-to-end load harness for /collect_entry.
+
+Drives the real Collector cog against a stand-in discord.Thread that serves
+N synthetic template messages in 100-message pages (with per-page latency and
+periodic rate-limit stalls), plus a local aiohttp server standing in for
+dispatcher.BASE_URL. Reports wall time, messages/sec, peak RSS and event-loop
+lag. Runs in a scratch directory so exports and indexes are not touched.
+
+    python loadtest.py --messages 20000 --page-latency 0.08
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import discord
+from aiohttp import web
+
+import dispatcher
+import history
+from collector_cog import Collector
+from workers import LoopLagMonitor
+
+
+PAGE_SIZE = 100
+GUILD_ID = 1
+USER_ID = 2
+
+REGIONS = ["Meblakier", "Agrist Conflux", "Ogtuchi Expanse", "Hitonsk Fringe", "Yatsuka Spur"]
+ECONOMIES = ["Technology - Promising", "Advanced Materials // Comfortable", "Trading / Wealthy", "Mining - Struggling"]
+CONFLICTS = ["1 - Tranquil", "2 - Unstable", "3 - Dangerous"]
+RESOURCES = ["Copper", "Paraffinium", "Star Bulb", "Magnetised Ferrite", "Gold", "Cobalt", "Sodium"]
+
+
+# -----------------------------
+# Synthetic content
+# -----------------------------
+def _glyphs(rng: random.Random) -> str:
+    return "".join(rng.choice("0123456789ABCDEF") for _ in range(12))
+
+
+def make_content(n: int, rng: random.Random) -> str:
+    kind = n % 5
+    if kind == 0:
+        return "\n".join([
+            f"System Name: Loadtest System {n}",
+            f"Region: {rng.choice(REGIONS)}",
+            "System classification: Gf4 // water",
+            "System Colour: Yellow",
+            "Dominant Lifeform: Vy'keen",
+            f"Economy: {rng.choice(ECONOMIES)}",
+            f"Conflict: {rng.choice(CONFLICTS)}",
+            f"Number of Planets: {rng.randint(1, 6)} + {rng.randint(0, 2)} moon",
+            f"System Coordinates: {_glyphs(rng)}",
+            "SPECIAL NOTE: synthetic entry generated by the load harness.",
+        ])
+    if kind == 1:
+        return "\n".join([
+            f"Planet Name: Loadtest Planet {n}",
+            "Planet Type: Lush",
+            f"Planet Glyphs: {_glyphs(rng)}",
+            "Resources: " + ", ".join(rng.sample(RESOURCES, 3)),
+            "Weather: Mild",
+            f"Sentinel Level: {rng.randint(1, 4)} - Low",
+        ])
+    if kind == 2:
+        return "\n".join([
+            f"Name: Loadtest Flora {n}",
+            "Flora Type: Shrub",
+            "Rarity: Common",
+            "Description: A plant produced for benchmarking.",
+        ])
+    return rng.choice(["nice find!", "added to the list", "can someone check the glyphs?", "o7"])
+
+
+# -----------------------------
+# Stand-ins for Discord objects
+# -----------------------------
+class FakeAuthor:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class FakeMessage:
+    def __init__(self, id: int, channel, content: str):
+        self.id = id
+        self.channel = channel
+        self.content = content
+        self.author = FakeAuthor(USER_ID)
+        self.created_at = discord.utils.snowflake_time(id)
+        self.attachments = []
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+
+
+class FakeThread(discord.Thread):
+    """
+    Looks enough like a discord.Thread to pass the cog's isinstance check and
+    serves history() the way discord.py pages it: PAGE_SIZE messages per
+    request, with latency per request and a rate-limit stall every
+    rate_limit_every requests.
+    """
+
+    def __init__(self, messages: int, page_latency: float, rate_limit_every: int, retry_after: float, seed: int):
+        rng = random.Random(seed)
+        start = discord.utils.utcnow() - datetime.timedelta(days=30)
+        step = datetime.timedelta(days=30) / max(messages, 1)
+        self.id = discord.utils.time_snowflake(start)
+        self.message_count = messages
+        self._messages = []
+        for n in range(messages):
+            snowflake = discord.utils.time_snowflake(start + step * (n + 1)) + n % 4096
+            self._messages.append(FakeMessage(snowflake, self, make_content(n, rng)))
+        self.last_message_id = self._messages[-1].id if self._messages else None
+        self.page_latency = page_latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self.sent = []
+
+    def __repr__(self):
+        return f"<FakeThread id={self.id} messages={len(self._messages)}>"
+
+    async def _request(self):
+        self.requests += 1
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            # discord.py sleeps through a 429 internally; the caller just sees a slow page
+            self.rate_limited += 1
+            await asyncio.sleep(self.retry_after)
+        await asyncio.sleep(self.page_latency)
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None, **kwargs):
+        lo = getattr(after, "id", after)
+        hi = getattr(before, "id", before)
+        if oldest_first is None:
+            oldest_first = after is not None
+        # Like discord.py: page from one bound, filter against the other, and
+        # stop after the first page that comes back short once filtered. A
+        # window pays for the page that crosses its far bound, and for one
+        # empty page when its size is a multiple of PAGE_SIZE.
+        if oldest_first:
+            source = [m for m in self._messages if lo is None or m.id > lo]
+            keep = lambda m: hi is None or m.id < hi
+        else:
+            source = [m for m in reversed(self._messages) if hi is None or m.id < hi]
+            keep = lambda m: lo is None or m.id > lo
+        start = 0
+        while True:
+            retrieve = PAGE_SIZE if limit is None else min(limit, PAGE_SIZE)
+            if retrieve < 1:
+                return
+            page = source[start:start + retrieve]
+            start += retrieve
+            if limit is not None:
+                limit -= len(page)
+            await self._request()
+            count = 0
+            for msg in filter(keep, page):
+                count += 1
+                yield msg
+            if count < PAGE_SIZE:
+                return
+
+    async def send(self, content=None, **kwargs):
+        msg = FakeMessage(0, self, content)
+        self.sent.append(msg)
+        return msg
+
+
+class _FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+    async def defer(self, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, channel):
+        self.channel = channel
+        self.guild_id = GUILD_ID
+        self.user = FakeAuthor(USER_ID)
+        self.permissions = discord.Permissions.none()
+        self.response = _FakeResponse()
+        self.followup = _FakeResponse()
+
+
+# -----------------------------
+# Fake collector endpoint
+# -----------------------------
+class FakeCollectorEndpoint:
+    def __init__(self, latency: float, error_rate: float, seed: int):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.received = {}
+        self.rejected = 0
+        self._runner = None
+        self.url = None
+
+    async def _handle(self, request: web.Request):
+        await request.read()
+        await asyncio.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.rejected += 1
+            return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": "0.05"})
+        path = request.match_info["path"]
+        self.received[path] = self.received.get(path, 0) + 1
+        return web.json_response({"ok": True})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/{path:.+}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run(args) -> dict:
+    endpoint = FakeCollectorEndpoint(args.endpoint_latency, args.endpoint_error_rate, args.seed)
+    await endpoint.start()
+    dispatcher.BASE_URL = endpoint.url
+    if args.history_concurrency:
+        history.HISTORY_CONCURRENCY = args.history_concurrency
+
+    build_start = time.perf_counter()
+    thread = FakeThread(args.messages, args.page_latency, args.rate_limit_every, args.retry_after, args.seed)
+    build_time = time.perf_counter() - build_start
+
+    cog = Collector(bot=None)
+    interaction = FakeInteraction(thread)
+
+    try:
+        async with LoopLagMonitor() as lag:
+            start = time.perf_counter()
+            await cog.collect_entry.callback(cog, interaction, dispatch=args.dispatch)
+            job = cog.jobs.jobs_for_guild(GUILD_ID)[-1]
+            await job.done.wait()
+            wall = time.perf_counter() - start
+    finally:
+        await cog.cog_unload()
+        await endpoint.stop()
+
+    return {
+        "messages": args.messages,
+        "job_state": job.state,
+        "job_error": job.error,
+        "entries": {k: v for k, v in job.counts.items() if v},
+        "quarantined": len(job.quarantined),
+        "history_requests": thread.requests,
+        "rate_limited": thread.rate_limited,
+        "dispatch": job.dispatcher.progress() if job.dispatcher else None,
+        "endpoint_received": endpoint.received,
+        "endpoint_rejected": endpoint.rejected,
+        "fixture_build_s": round(build_time, 3),
+        "wall_s": round(wall, 3),
+        "messages_per_s": round(args.messages / wall, 1) if wall else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "loop_lag_worst_ms": round(lag.worst * 1000, 1),
+        "loop_lag_mean_ms": round(lag.mean * 1000, 2),
+        "job_loop_lag_worst_ms": round(job.loop_lag * 1000, 1),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--messages", type=int, default=5000)
+    ap.add_argument("--page-latency", type=float, default=0.08, help="seconds per 100-message history page")
+    ap.add_argument("--rate-limit-every", type=int, default=25, help="stall every Nth history request (0 = never)")
+    ap.add_argument("--retry-after", type=float, default=0.5, help="seconds a rate-limit stall lasts")
+    ap.add_argument("--history-concurrency", type=int, default=None, help="parallel history windows")
+    ap.add_argument("--dispatch", action="store_true", help="stream entries to the fake collector endpoint")
+    ap.add_argument("--endpoint-latency", type=float, default=0.01)
+    ap.add_argument("--endpoint-error-rate", type=float, default=0.0, help="fraction of POSTs answered with 429")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workdir", default=None, help="where exports/indexes go (default: a temp dir)")
+    args = ap.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="vhc-loadtest-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    report = asyncio.run(run(args))
+    width = max(len(k) for k in report)
+    for key, value in report.items():
+        print(f"{key:<{width}}  {value}")
+    print(f"{'workdir':<{width}}  {workdir}")
+
+
+if __name__ == "__main__":
+    main()
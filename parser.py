@@ -1,7 +1,23 @@
+import os
 import re
-from typing import Optional, List
+import threading
+import time
+from typing import Optional, List, Tuple
 import discord
 
+import records
+from templates import default_templates
+
+
+# Per-message limits; anything over them is quarantined instead of parsed.
+# Discord already caps a message at 4000 characters, so only lines are counted.
+MAX_MESSAGE_LINES = int(os.getenv("VHC_MAX_MESSAGE_LINES", "200"))
+PARSE_TIME_BUDGET = float(os.getenv("VHC_PARSE_TIME_BUDGET", "0.25"))  # seconds
+GLYPH_FALLBACK_CHARS = 256
+MAX_LIST_ITEMS = 64
+# How far back from a block boundary to look for the new entry's name line
+SEGMENT_LOOKBACK = 3
+
 
 # Glyph mapping (stub)
 #
@@ -56,6 +72,43 @@ def normalize_key(label: str) -> str:
     s = re.sub(r"[\s\-]+", "_", s)
     return s
 
+# -----------------------------
+# Parse budget
+# -----------------------------
+class ParseBudgetExceeded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+# Parsing may run on several executor threads at once
+_budget = threading.local()
+
+def check_message_limits(text: str) -> Optional[str]:
+    lines = text.count("\n") + 1
+    if lines > MAX_MESSAGE_LINES:
+        return f"too many lines ({lines} > {MAX_MESSAGE_LINES})"
+    return None
+
+def start_budget(seconds: float = PARSE_TIME_BUDGET):
+    _budget.seconds = seconds
+    _budget.deadline = time.perf_counter() + seconds
+
+def check_budget():
+    deadline = getattr(_budget, "deadline", None)
+    if deadline is not None and time.perf_counter() > deadline:
+        raise ParseBudgetExceeded(f"parse time budget exceeded ({_budget.seconds * 1000:.0f} ms)")
+
+def set_list_field(entry: dict, key: str, value: str):
+    """
+    Store the items of a list-valued field under entry[key]. Items past
+    MAX_LIST_ITEMS are dropped, and entry["<key>_truncated"] then records
+    how many there were, so the cut is visible in the record.
+    """
+    items = [x for x in re.split(r"[,/\\//\-]+", value) if x.strip()]
+    entry[key] = [clean_value(strip_emojis(x)) for x in items[:MAX_LIST_ITEMS]]
+    if len(items) > MAX_LIST_ITEMS:
+        entry[f"{key}_truncated"] = len(items)
+
 # -----------------------------
 # Glyph extraction
 # -----------------------------
@@ -68,7 +121,8 @@ def glyphs_to_hex(text: Optional[str]) -> str:
         tokens = re.findall(r":(portal[a-f0-9]):", text, flags=re.IGNORECASE)
     if tokens:
         return "".join(GLYPH_MAP.get(t.lower(), "?") for t in tokens)
-    fallback = re.findall(r"[0-9A-Fa-f]+", text)
+    # Only the head of the text can plausibly be an address; don't scan pastes
+    fallback = re.findall(r"[0-9A-Fa-f]+", text[:GLYPH_FALLBACK_CHARS])
     if fallback:
         return "".join(fallback)
     return text.strip()
@@ -76,38 +130,145 @@ def glyphs_to_hex(text: Optional[str]) -> str:
 # -----------------------------
 # Template detection
 # -----------------------------
-def detect_template_type(text: str) -> Optional[str]:
+def detect_template_type(text: str, templates=None) -> Optional[str]:
+    """
+    Type markers come from the guild's compiled templates (see templates.py);
+    all of them are matched in one pass over the normalized text.
+    """
     if not text:
         return None
     normalized = normalize_line(text)
-    lower = normalized.lower()
-    if "system colour" in lower or "system color" in lower or "system classification" in lower:
-        return "system"
-    if "planet type" in lower or "planet glyphs" in lower:
-        return "planet"
-    if "flora type" in lower:
-        return "flora"
-    if "fauna class" in lower:
-        return "fauna"
-    if "discovery type" in lower or "associated resources" in lower:
-        return "archaeology"
-    if "mineral type" in lower or "primary resource yield" in lower:
-        return "mineral"
-    for line in normalized.splitlines():
-        l = line.strip().lower()
-        if "system colour" in l or "system classification" in l:
-            return "system"
-        if "planet type" in l or "planet glyphs" in l:
-            return "planet"
-        if "flora type" in l:
-            return "flora"
-        if "fauna class" in l:
-            return "fauna"
-        if "discovery type" in l:
-            return "archaeology"
-        if "mineral type" in l:
-            return "mineral"
-    return None
+    return (templates or default_templates()).detect(normalized.lower())
+
+# -----------------------------
+# Segmentation
+# -----------------------------
+def _line_header(clean: str) -> Optional[str]:
+    """Lower-cased label of a "Label: value" line, or None."""
+    head, sep, _ = (strip_emojis(clean) or "").partition(":")
+    head = re.sub(r"^[^0-9A-Za-z]+", "", head)
+    return head.lower() if sep and head else None
+
+def _block_start(lines: List[str], headers: list, start: int, i: int, tpl, claimed) -> int:
+    """
+    Where the block detected at line i really begins: at the new entry's
+    name line, or after a blank line, if either sits just above it. A name
+    line in `claimed` already belongs to the current block and stays there.
+    """
+    j = i - 1
+    while j > start and j >= i - SEGMENT_LOOKBACK:
+        if not lines[j].strip():
+            return j + 1
+        if headers[j] is not None:
+            return j if tpl.key_field(headers[j]) == "name" and j not in claimed else i
+        j -= 1
+    return i
+
+def _opens_block(lines: List[str], headers: list, start: int, i: int, templates, marker: str,
+                 seen: dict) -> bool:
+    """
+    Whether another type's marker at line i begins a new entry rather than
+    being a stray line of the current one ("Planet Type" inside a flora
+    entry): a blank line or the new entry's own name must sit just above
+    it, or - once the current entry has its own name - just below it,
+    before any free-text line or another type's marker.
+    """
+    if not lines[i - 1].strip():
+        return True
+    if _block_start(lines, headers, start, i, templates[marker], set(seen.values())) < i:
+        return True
+    if "name" not in seen:
+        return False
+    named = False
+    for line in lines[i + 1:i + 1 + SEGMENT_LOOKBACK]:
+        header = _line_header(normalize_line(line))
+        if header is None:
+            # Blank line, screenshot line or prose: this entry ends here
+            break
+        if templates.detect(header) not in (None, marker):
+            # Any name ahead belongs to that entry
+            return False
+        if templates[marker].key_field(header) == "name":
+            named = True
+    return named
+
+def segment_message(text: str, templates=None) -> List[Tuple[str, str]]:
+    """
+    Split a message into (entry_type, block text) pairs in one pass over its
+    lines. A new block starts where a marker of a different type appears
+    next to that entry's name or after a blank line (e.g. planets pasted
+    under their system), or where one of the current type's key fields -
+    its name or a marker field - shows up a second time (two planets back
+    to back). A marker with neither stays in the current block.
+    """
+    templates = templates or default_templates()
+    lines = text.splitlines()
+    headers = []
+    blocks = []
+    # seen: the current block's key fields -> the line that first carried each
+    start, entry_type, marked, seen = 0, None, False, {}
+
+    def key_fields(tpl, first: int, last: int) -> dict:
+        found = {}
+        for j in range(first, last):
+            field = tpl.key_field(headers[j]) if headers[j] else None
+            if field is not None:
+                found.setdefault(field, j)
+        return found
+
+    for i, raw in enumerate(lines):
+        check_budget()
+        header = _line_header(normalize_line(raw))
+        headers.append(header)
+        if header is None:
+            continue
+
+        marker = templates.detect(header)
+        if marker is not None and not marked:
+            # First marker of this block settles its type
+            if marker != entry_type:
+                entry_type = marker
+                seen = key_fields(templates[marker], start, i)
+            marked = True
+        elif (marker is not None and marker != entry_type
+              and _opens_block(lines, headers, start, i, templates, marker, seen)):
+            split = _block_start(lines, headers, start, i, templates[marker], set(seen.values()))
+            if split > start:
+                blocks.append((entry_type, "\n".join(lines[start:split])))
+            start, entry_type = split, marker
+            seen = key_fields(templates[marker], split, i)
+        elif entry_type is not None and templates[entry_type].key_field(header) in seen:
+            split = _block_start(lines, headers, start, i, templates[entry_type], set(seen.values()))
+            blocks.append((entry_type, "\n".join(lines[start:split])))
+            # Same type until a marker says otherwise
+            start, marked = split, marker is not None
+            seen = key_fields(templates[entry_type], split, i)
+
+        if entry_type is not None:
+            field = templates[entry_type].key_field(header)
+            if field is not None:
+                seen.setdefault(field, i)
+
+    if entry_type is not None:
+        blocks.append((entry_type, "\n".join(lines[start:])))
+    elif lines:
+        # Markers outside "Label: value" lines; parse the message as one entry
+        entry_type = templates.detect(normalize_line(text).lower())
+        if entry_type:
+            blocks.append((entry_type, text))
+    return blocks
+
+class _BlockMessage:
+    """One segment of a message, shaped like the message for the parsers."""
+    __slots__ = ("id", "content", "channel", "author", "created_at", "attachments")
+
+    def __init__(self, message, content: str, attachments: list):
+        self.id = message.id
+        self.content = content
+        self.channel = message.channel
+        self.author = message.author
+        self.created_at = message.created_at
+        self.attachments = attachments
 
 # -----------------------------
 # Meta builder
@@ -127,6 +288,7 @@ def collect_multiline_field(lines: List[str], start_index: int) -> (str, int):
     collected = []
     i = start_index
     while i < len(lines):
+        check_budget()
         raw = lines[i]
         clean = normalize_line(raw)
         if clean.startswith("--") or (":" in clean and re.match(r"^[A-Za-z0-9 \-]+:", clean)):
@@ -166,7 +328,8 @@ def find_lookahead_block(lines: List[str], start: int, max_lines: int = 6) -> st
 # -----------------------------
 # System parser (Option C, integrated)
 # -----------------------------
-def parse_system_entry(message: discord.Message) -> dict:
+def parse_system_entry(message: discord.Message, templates=None) -> dict:
+    tpl = (templates or default_templates())["system"]
     raw_lines = [l for l in (message.content or "").splitlines()]
     system = {
         "name": None,
@@ -187,29 +350,31 @@ def parse_system_entry(message: discord.Message) -> dict:
 
     i = 0
     while i < len(raw_lines):
+        check_budget()
         raw = raw_lines[i]
         clean = normalize_line(raw)
+        lower = clean.lower()
         value = clean_value(extract_after_colon(clean))
 
-        if line_contains_field(clean, "System Name"):
+        if tpl.has(lower, "name"):
             system["name"] = value
 
-        elif line_contains_field(clean, "Region"):
+        elif tpl.has(lower, "region"):
             if value and (len(value.split()) > 8 or re.search(r"\b(cannot|only|via|portal|warp|drive)\b", value, flags=re.IGNORECASE)):
                 system["special_note"] = value
             else:
                 system["region"] = value
 
-        elif line_contains_field(clean, "System classification"):
+        elif tpl.has(lower, "classification"):
             system["classification"] = value
 
-        elif line_contains_field(clean, "SPECIAL NOTE") or line_contains_field(clean, "Special Note"):
+        elif tpl.has(lower, "special_note"):
             inline = value
             note, last_idx = collect_multiline_field(raw_lines, i + 1)
             system["special_note"] = "\n".join(filter(None, [inline, note])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "System Code"):
+        elif tpl.has(lower, "code"):
             if value:
                 system["code_raw"] = value
                 system["code_hex"] = glyphs_to_hex(value)
@@ -228,13 +393,13 @@ def parse_system_entry(message: discord.Message) -> dict:
                             break
                     i += consumed
 
-        elif line_contains_field(clean, "System Colour") or line_contains_field(clean, "System Color"):
+        elif tpl.has(lower, "colour"):
             system["colour"] = strip_emojis(value)
 
-        elif line_contains_field(clean, "Dominant Lifeform"):
+        elif tpl.has(lower, "lifeform"):
             system["lifeform"] = strip_emojis(value)
 
-        elif line_contains_field(clean, "Economy"):
+        elif tpl.has(lower, "economy"):
             econ = strip_emojis(value or "")
             if "//" in econ:
                 t, s = econ.split("//", 1)
@@ -251,7 +416,7 @@ def parse_system_entry(message: discord.Message) -> dict:
             else:
                 system["economy"]["type"] = econ or None
 
-        elif line_contains_field(clean, "Conflict"):
+        elif tpl.has(lower, "conflict"):
             conflict = strip_emojis(value or "")
             m = re.match(r"(\d+)\s*[-–]\s*(.+)", conflict)
             if m:
@@ -271,7 +436,7 @@ def parse_system_entry(message: discord.Message) -> dict:
             else:
                 system["conflict"]["status"] = conflict or None
 
-        elif line_contains_field(clean, "Number of Planets"):
+        elif tpl.has(lower, "planets"):
             text = (value or "").lower()
             m = re.match(r"(\d+)\s*\+\s*(\d+)", text)
             if m:
@@ -292,10 +457,10 @@ def parse_system_entry(message: discord.Message) -> dict:
                 i += 1
                 continue
 
-        elif line_contains_field(clean, "System Coordinates"):
+        elif tpl.has(lower, "coordinates"):
             system["coordinates"] = value
 
-        elif line_contains_field(clean, "Screenshot") or clean.startswith("-- screenshot") or clean.startswith("--"):
+        elif tpl.has(lower, "screenshot") or clean.startswith("-- screenshot") or clean.startswith("--"):
             if message.attachments:
                 system["screenshot_url"] = message.attachments[0].url
             else:
@@ -334,7 +499,8 @@ def parse_system_entry(message: discord.Message) -> dict:
 # -----------------------------
 # Planet parser
 # -----------------------------
-def parse_planet_entry(message: discord.Message) -> dict:
+def parse_planet_entry(message: discord.Message, templates=None) -> dict:
+    tpl = (templates or default_templates())["planet"]
     raw_lines = [l for l in (message.content or "").splitlines()]
     planet = {
         "name": None,
@@ -352,17 +518,19 @@ def parse_planet_entry(message: discord.Message) -> dict:
 
     i = 0
     while i < len(raw_lines):
+        check_budget()
         raw = raw_lines[i]
         clean = normalize_line(raw)
+        lower = clean.lower()
         value = clean_value(extract_after_colon(clean))
 
-        if line_contains_field(clean, "Planet Name") or line_contains_field(clean, "Name"):
+        if tpl.has(lower, "name"):
             planet["name"] = value
 
-        elif line_contains_field(clean, "Planet Type") or line_contains_field(clean, "Type"):
+        elif tpl.has(lower, "type"):
             planet["type"] = value
 
-        elif line_contains_field(clean, "Planet Glyphs") or line_contains_field(clean, "Glyphs"):
+        elif tpl.has(lower, "glyphs"):
             if value:
                 raw_g = value
             else:
@@ -370,18 +538,17 @@ def parse_planet_entry(message: discord.Message) -> dict:
             planet["glyphs_raw"] = raw_g or planet["glyphs_raw"]
             planet["glyphs_hex"] = glyphs_to_hex(planet["glyphs_raw"]) if planet["glyphs_raw"] else planet["glyphs_hex"]
 
-        elif line_contains_field(clean, "Resources"):
+        elif tpl.has(lower, "resources"):
             res = value
             if not res:
                 res = find_lookahead_block(raw_lines, i + 1)
             if res:
-                items = re.split(r"[,/\\//\-]+", res)
-                planet["resources"] = [clean_value(strip_emojis(x)) for x in items if x.strip()]
+                set_list_field(planet, "resources", res)
 
-        elif line_contains_field(clean, "Weather"):
+        elif tpl.has(lower, "weather"):
             planet["weather"] = value
 
-        elif line_contains_field(clean, "Sentinel Level") or line_contains_field(clean, "Sentinal Level"):
+        elif tpl.has(lower, "sentinel_level"):
             s = value or ""
             m = re.match(r"(\d+)\s*[-–]\s*(.+)", s)
             if m:
@@ -390,18 +557,18 @@ def parse_planet_entry(message: discord.Message) -> dict:
                 m2 = re.search(r"(\d+)", s)
                 planet["sentinel_level"] = m2.group(1) if m2 else (s or None)
 
-        elif line_contains_field(clean, "Flora"):
+        elif tpl.has(lower, "flora"):
             planet["flora"] = value
 
-        elif line_contains_field(clean, "Fauna"):
+        elif tpl.has(lower, "fauna"):
             planet["fauna"] = value
 
-        elif line_contains_field(clean, "Special Note") or line_contains_field(clean, "SPECIAL NOTE"):
+        elif tpl.has(lower, "special_note"):
             inline = value
             note = find_lookahead_block(raw_lines, i + 1)
             planet["special_note"] = "\n".join(filter(None, [inline, note])).strip()
 
-        elif line_contains_field(clean, "Screenshot"):
+        elif tpl.has(lower, "screenshot"):
             if message.attachments:
                 planet["screenshot_url"] = message.attachments[0].url
             else:
@@ -425,7 +592,8 @@ def parse_planet_entry(message: discord.Message) -> dict:
 # -----------------------------
 # Flora parser
 # -----------------------------
-def parse_flora_entry(message: discord.Message) -> dict:
+def parse_flora_entry(message: discord.Message, templates=None) -> dict:
+    tpl = (templates or default_templates())["flora"]
     raw_lines = [l for l in (message.content or "").splitlines()]
     flora = {
         "name": None,
@@ -445,53 +613,55 @@ def parse_flora_entry(message: discord.Message) -> dict:
 
     i = 0
     while i < len(raw_lines):
+        check_budget()
         raw = raw_lines[i]
         clean = normalize_line(raw)
+        lower = clean.lower()
         value = clean_value(extract_after_colon(clean))
 
-        if line_contains_field(clean, "Name"):
+        if tpl.has(lower, "name"):
             flora["name"] = value
 
-        elif line_contains_field(clean, "Planet"):
+        elif tpl.has(lower, "planet"):
             flora["planet"] = value
 
-        elif line_contains_field(clean, "Star System"):
+        elif tpl.has(lower, "star_system"):
             flora["star_system"] = value
 
-        elif line_contains_field(clean, "Galaxy"):
+        elif tpl.has(lower, "galaxy"):
             flora["galaxy"] = value
 
-        elif line_contains_field(clean, "Coordinates"):
+        elif tpl.has(lower, "coordinates"):
             flora["coordinates"] = value
 
-        elif line_contains_field(clean, "Biome"):
+        elif tpl.has(lower, "biome"):
             flora["biome"] = value
 
-        elif line_contains_field(clean, "Flora Type"):
+        elif tpl.has(lower, "flora_type"):
             flora["flora_type"] = value
 
-        elif line_contains_field(clean, "Rarity"):
+        elif tpl.has(lower, "rarity"):
             flora["rarity"] = value
 
-        elif line_contains_field(clean, "Discovery Date"):
+        elif tpl.has(lower, "discovery_date"):
             flora["discovery_date"] = value
 
-        elif line_contains_field(clean, "Discovered By"):
+        elif tpl.has(lower, "discovered_by"):
             flora["discovered_by"] = value
 
-        elif line_contains_field(clean, "Description") or line_contains_field(clean, "Description / Notes"):
+        elif tpl.has(lower, "description"):
             inline = value
             desc, last_idx = collect_multiline_field(raw_lines, i + 1)
             flora["description"] = "\n".join(filter(None, [inline, desc])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Special Note") or line_contains_field(clean, "SPECIAL NOTE"):
+        elif tpl.has(lower, "special_note"):
             inline = value
             note, last_idx = collect_multiline_field(raw_lines, i + 1)
             flora["special_note"] = "\n".join(filter(None, [inline, note])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Screenshot"):
+        elif tpl.has(lower, "screenshot"):
             if message.attachments:
                 flora["screenshot_url"] = message.attachments[0].url
             else:
@@ -514,7 +684,8 @@ def parse_flora_entry(message: discord.Message) -> dict:
 # -----------------------------
 # Fauna parser
 # -----------------------------
-def parse_fauna_entry(message: discord.Message) -> dict:
+def parse_fauna_entry(message: discord.Message, templates=None) -> dict:
+    tpl = (templates or default_templates())["fauna"]
     raw_lines = [l for l in (message.content or "").splitlines()]
     fauna = {
         "name": None,
@@ -536,59 +707,61 @@ def parse_fauna_entry(message: discord.Message) -> dict:
 
     i = 0
     while i < len(raw_lines):
+        check_budget()
         raw = raw_lines[i]
         clean = normalize_line(raw)
+        lower = clean.lower()
         value = clean_value(extract_after_colon(clean))
 
-        if line_contains_field(clean, "Name"):
+        if tpl.has(lower, "name"):
             fauna["name"] = value
 
-        elif line_contains_field(clean, "Planet"):
+        elif tpl.has(lower, "planet"):
             fauna["planet"] = value
 
-        elif line_contains_field(clean, "Star System"):
+        elif tpl.has(lower, "star_system"):
             fauna["star_system"] = value
 
-        elif line_contains_field(clean, "Galaxy"):
+        elif tpl.has(lower, "galaxy"):
             fauna["galaxy"] = value
 
-        elif line_contains_field(clean, "Coordinates"):
+        elif tpl.has(lower, "coordinates"):
             fauna["coordinates"] = value
 
-        elif line_contains_field(clean, "Biome"):
+        elif tpl.has(lower, "biome"):
             fauna["biome"] = value
 
-        elif line_contains_field(clean, "Fauna Class"):
+        elif tpl.has(lower, "fauna_class"):
             fauna["fauna_class"] = value
 
-        elif line_contains_field(clean, "Temperament"):
+        elif tpl.has(lower, "temperament"):
             fauna["temperament"] = value
 
-        elif line_contains_field(clean, "Activity Pattern"):
+        elif tpl.has(lower, "activity_pattern"):
             fauna["activity_pattern"] = value
 
-        elif line_contains_field(clean, "Rarity"):
+        elif tpl.has(lower, "rarity"):
             fauna["rarity"] = value
 
-        elif line_contains_field(clean, "Discovery Date"):
+        elif tpl.has(lower, "discovery_date"):
             fauna["discovery_date"] = value
 
-        elif line_contains_field(clean, "Discovered By"):
+        elif tpl.has(lower, "discovered_by"):
             fauna["discovered_by"] = value
 
-        elif line_contains_field(clean, "Description") or line_contains_field(clean, "Description / Notes"):
+        elif tpl.has(lower, "description"):
             inline = value
             desc, last_idx = collect_multiline_field(raw_lines, i + 1)
             fauna["description"] = "\n".join(filter(None, [inline, desc])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Special Note") or line_contains_field(clean, "SPECIAL NOTE"):
+        elif tpl.has(lower, "special_note"):
             inline = value
             note, last_idx = collect_multiline_field(raw_lines, i + 1)
             fauna["special_note"] = "\n".join(filter(None, [inline, note])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Screenshot"):
+        elif tpl.has(lower, "screenshot"):
             if message.attachments:
                 fauna["screenshot_url"] = message.attachments[0].url
             else:
@@ -611,7 +784,8 @@ def parse_fauna_entry(message: discord.Message) -> dict:
 # -----------------------------
 # Archaeology parser
 # -----------------------------
-def parse_archaeology_entry(message: discord.Message) -> dict:
+def parse_archaeology_entry(message: discord.Message, templates=None) -> dict:
+    tpl = (templates or default_templates())["archaeology"]
     raw_lines = [l for l in (message.content or "").splitlines()]
     arch = {
         "name": None,
@@ -634,67 +808,68 @@ def parse_archaeology_entry(message: discord.Message) -> dict:
 
     i = 0
     while i < len(raw_lines):
+        check_budget()
         raw = raw_lines[i]
         clean = normalize_line(raw)
+        lower = clean.lower()
         value = clean_value(extract_after_colon(clean))
 
-        if line_contains_field(clean, "Name"):
+        if tpl.has(lower, "name"):
             arch["name"] = value
 
-        elif line_contains_field(clean, "Discovery Type"):
+        elif tpl.has(lower, "discovery_type"):
             arch["discovery_type"] = value
 
-        elif line_contains_field(clean, "Planet"):
+        elif tpl.has(lower, "planet"):
             arch["planet"] = value
 
-        elif line_contains_field(clean, "Star System"):
+        elif tpl.has(lower, "star_system"):
             arch["star_system"] = value
 
-        elif line_contains_field(clean, "Galaxy"):
+        elif tpl.has(lower, "galaxy"):
             arch["galaxy"] = value
 
-        elif line_contains_field(clean, "Coordinates"):
+        elif tpl.has(lower, "coordinates"):
             arch["coordinates"] = value
 
-        elif line_contains_field(clean, "Biome"):
+        elif tpl.has(lower, "biome"):
             arch["biome"] = value
 
-        elif line_contains_field(clean, "Depth") or line_contains_field(clean, "Depth or Location"):
+        elif tpl.has(lower, "depth_or_location"):
             arch["depth_or_location"] = value
 
-        elif line_contains_field(clean, "Estimated Age") or line_contains_field(clean, "Estimated Age / Classification"):
+        elif tpl.has(lower, "estimated_age"):
             arch["estimated_age"] = value
 
-        elif line_contains_field(clean, "Rarity"):
+        elif tpl.has(lower, "rarity"):
             arch["rarity"] = value
 
-        elif line_contains_field(clean, "Discovery Date"):
+        elif tpl.has(lower, "discovery_date"):
             arch["discovery_date"] = value
 
-        elif line_contains_field(clean, "Discovered By"):
+        elif tpl.has(lower, "discovered_by"):
             arch["discovered_by"] = value
 
-        elif line_contains_field(clean, "Associated Resources"):
+        elif tpl.has(lower, "associated_resources"):
             assoc = value
             if not assoc:
                 assoc = find_lookahead_block(raw_lines, i + 1)
             if assoc:
-                items = re.split(r"[,/\\//\-]+", assoc)
-                arch["associated_resources"] = [clean_value(strip_emojis(x)) for x in items if x.strip()]
+                set_list_field(arch, "associated_resources", assoc)
 
-        elif line_contains_field(clean, "Description") or line_contains_field(clean, "Description / Notes"):
+        elif tpl.has(lower, "description"):
             inline = value
             desc, last_idx = collect_multiline_field(raw_lines, i + 1)
             arch["description"] = "\n".join(filter(None, [inline, desc])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Special Note") or line_contains_field(clean, "SPECIAL NOTE"):
+        elif tpl.has(lower, "special_note"):
             inline = value
             note, last_idx = collect_multiline_field(raw_lines, i + 1)
             arch["special_note"] = "\n".join(filter(None, [inline, note])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Screenshot"):
+        elif tpl.has(lower, "screenshot"):
             if message.attachments:
                 arch["screenshot_url"] = message.attachments[0].url
             else:
@@ -707,8 +882,7 @@ def parse_archaeology_entry(message: discord.Message) -> dict:
             key = normalize_key(key_label)
             val = clean_value(extract_after_colon(clean))
             if re.search(r",|/|//|-", val or ""):
-                items = re.split(r"[,/\\//\-]+", val)
-                arch[key] = [clean_value(strip_emojis(x)) for x in items if x.strip()]
+                set_list_field(arch, key, val)
             else:
                 arch[key] = val
 
@@ -722,7 +896,8 @@ def parse_archaeology_entry(message: discord.Message) -> dict:
 # -----------------------------
 # Mineral parser
 # -----------------------------
-def parse_mineral_entry(message: discord.Message) -> dict:
+def parse_mineral_entry(message: discord.Message, templates=None) -> dict:
+    tpl = (templates or default_templates())["mineral"]
     raw_lines = [l for l in (message.content or "").splitlines()]
     mineral = {
         "name": None,
@@ -745,72 +920,72 @@ def parse_mineral_entry(message: discord.Message) -> dict:
 
     i = 0
     while i < len(raw_lines):
+        check_budget()
         raw = raw_lines[i]
         clean = normalize_line(raw)
+        lower = clean.lower()
         value = clean_value(extract_after_colon(clean))
 
-        if line_contains_field(clean, "Name"):
+        if tpl.has(lower, "name"):
             mineral["name"] = value
 
-        elif line_contains_field(clean, "Mineral Type"):
+        elif tpl.has(lower, "mineral_type"):
             mineral["mineral_type"] = value
 
-        elif line_contains_field(clean, "Planet"):
+        elif tpl.has(lower, "planet"):
             mineral["planet"] = value
 
-        elif line_contains_field(clean, "Star System"):
+        elif tpl.has(lower, "star_system"):
             mineral["star_system"] = value
 
-        elif line_contains_field(clean, "Galaxy"):
+        elif tpl.has(lower, "galaxy"):
             mineral["galaxy"] = value
 
-        elif line_contains_field(clean, "Coordinates"):
+        elif tpl.has(lower, "coordinates"):
             mineral["coordinates"] = value
 
-        elif line_contains_field(clean, "Biome"):
+        elif tpl.has(lower, "biome"):
             mineral["biome"] = value
 
-        elif line_contains_field(clean, "Formation Type"):
+        elif tpl.has(lower, "formation_type"):
             mineral["formation_type"] = value
 
-        elif line_contains_field(clean, "Primary Resource Yield"):
+        elif tpl.has(lower, "primary_yield"):
             p = value
             if not p:
                 p = find_lookahead_block(raw_lines, i + 1)
             if p:
-                items = re.split(r"[,/\\//\-]+", p)
-                mineral["primary_yield"] = [clean_value(strip_emojis(x)) for x in items if x.strip()]
+                set_list_field(mineral, "primary_yield", p)
 
-        elif line_contains_field(clean, "Secondary Resource Yield"):
+        elif tpl.has(lower, "secondary_yield"):
             s = value
             if not s:
                 s = find_lookahead_block(raw_lines, i + 1)
             if s:
-                items = re.split(r"[,/\\//\-]+", s)
-                mineral["secondary_yield"] = [clean_value(strip_emojis(x)) for x in items if x.strip()]
+                set_list_field(mineral, "secondary_yield", s)
 
-        elif line_contains_field(clean, "Rarity"):
+        elif tpl.has(lower, "rarity"):
             mineral["rarity"] = value
 
-        elif line_contains_field(clean, "Discovery Date"):
+        elif tpl.has(lower, "discovery_date"):
             mineral["discovery_date"] = value
 
-        elif line_contains_field(clean, "Discovered By"):
+        elif tpl.has(lower, "discovered_by"):
             mineral["discovered_by"] = value
 
-        elif line_contains_field(clean, "Description") or line_contains_field(clean, "Description / Notes"):
+        elif tpl.has(lower, "description"):
             inline = value
             desc, last_idx = collect_multiline_field(raw_lines, i + 1)
             mineral["description"] = "\n".join(filter(None, [inline, desc])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Special Note") or line_contains_field(clean, "SPECIAL NOTE"):
+        elif tpl.has(lower, "special_note"):
             inline = value
             note, last_idx = collect_multiline_field(raw_lines, i + 1)
             mineral["special_note"] = "\n".join(filter(None, [inline, note])).strip()
             i = last_idx
 
-        elif line_contains_field(clean, "Screenshot"):
+        elif tpl.has(lower, "screenshot"):
             if message.attachments:
                 mineral["screenshot_url"] = message.attachments[0].url
             else:
@@ -823,8 +998,7 @@ def parse_mineral_entry(message: discord.Message) -> dict:
             key = normalize_key(key_label)
             val = clean_value(extract_after_colon(clean))
             if re.search(r",|/|//|-", val or ""):
-                items = re.split(r"[,/\\//\-]+", val)
-                mineral[key] = [clean_value(strip_emojis(x)) for x in items if x.strip()]
+                set_list_field(mineral, key, val)
             else:
                 mineral[key] = val
 
@@ -833,4 +1007,50 @@ def parse_mineral_entry(message: discord.Message) -> dict:
     if not mineral["screenshot_url"] and message.attachments:
         mineral["screenshot_url"] = message.attachments[0].url
 
-    return {"entry_type": "mineral", "mineral": mineral, "meta": build_meta(message)}
\ No newline at end of file
+    return {"entry_type": "mineral", "mineral": mineral, "meta": build_meta(message)}
+# -----------------------------
+# Routing
+# -----------------------------
+PARSERS = {
+    "system": parse_system_entry,
+    "planet": parse_planet_entry,
+    "flora": parse_flora_entry,
+    "fauna": parse_fauna_entry,
+    "archaeology": parse_archaeology_entry,
+    "mineral": parse_mineral_entry,
+}
+
+def parse_message(message: discord.Message, templates=None) -> list:
+    """
+    Split one message into template blocks (see segment_message) and parse
+    each into a typed record (see records.py); meta.block numbers them in
+    message order. Messages over the line limit, over the time budget,
+    or that crash a parser come back as a single records.Quarantined instead.
+    """
+    text = message.content or ""
+    reason = check_message_limits(text)
+    if reason:
+        return [records.Quarantined(message.channel.id, message.id, reason)]
+
+    start_budget()
+    try:
+        blocks = segment_message(text, templates)
+        attachments = list(message.attachments)
+        # Screenshots can only be matched to blocks when there is one per block
+        paired = len(blocks) > 1 and len(attachments) == len(blocks)
+        results = []
+        for n, (entry_type, block) in enumerate(blocks):
+            if paired:
+                shots = attachments[n:n + 1]
+            else:
+                shots = attachments if n == 0 else []
+            entry = PARSERS[entry_type](_BlockMessage(message, block, shots), templates)
+            entry["meta"]["block"] = n
+            results.append(records.from_dict(entry))
+        return results
+    except ParseBudgetExceeded as e:
+        return [records.Quarantined(message.channel.id, message.id, e.reason)]
+    except Exception as e:
+        return [records.Quarantined(message.channel.id, message.id, f"parser error: {e!r}")]
+    finally:
+        _budget.deadline = None
@@ -0,0 +1,334 @@
+import json
+import re
+from dataclasses import dataclass, fields
+from typing import ClassVar, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+# -----------------------------
+# Coercion helpers
+# -----------------------------
+_INT_RE = re.compile(r"\s*(-?\d+)")
+_PLAIN_INT_RE = re.compile(r"\s*-?\d+\s*")
+
+def to_int(value) -> Optional[int]:
+    """Leading integer of a value ("2 - Low" -> 2), or None."""
+    if value is None or isinstance(value, int):
+        return value
+    m = _INT_RE.match(str(value))
+    return int(m.group(1)) if m else None
+
+def is_plain_int(value) -> bool:
+    """True when to_int(value) loses nothing: an int, or digits only."""
+    return isinstance(value, int) or _PLAIN_INT_RE.fullmatch(str(value)) is not None
+
+def to_str_list(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [v for v in value if v]
+
+
+# -----------------------------
+# Shared parts
+# -----------------------------
+@dataclass(slots=True)
+class Meta:
+    thread_id: int
+    message_id: int
+    submitted_by: int
+    timestamp: Optional[str] = None
+    # Position of the entry among the templates pasted into one message
+    block: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "thread_id": self.thread_id,
+            "message_id": self.message_id,
+            "submitted_by": self.submitted_by,
+            "timestamp": self.timestamp,
+            "block": self.block,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Meta":
+        return cls(d["thread_id"], d["message_id"], d["submitted_by"], d.get("timestamp"), d.get("block", 0))
+
+
+@dataclass(slots=True)
+class Economy:
+    type: Optional[str] = None
+    status: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        d = {}
+        if self.type is not None:
+            d["type"] = self.type
+        if self.status is not None:
+            d["status"] = self.status
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Economy":
+        return cls(d.get("type"), d.get("status"))
+
+
+@dataclass(slots=True)
+class Conflict:
+    status: Optional[str] = None
+    level: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {"status": self.status, "level": self.level}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Conflict":
+        return cls(d.get("status"), to_int(d.get("level")))
+
+
+# -----------------------------
+# Entry records
+# -----------------------------
+class _Entry:
+    """
+    Behaviour shared by the per-type records. Declared fields hold the
+    template values; anything else a parser picked up (free-form "Label:
+    value" lines) is kept in `extra`, which stays None when empty.
+    """
+    __slots__ = ()
+
+    entry_type: ClassVar[str]
+    _BODY: ClassVar[tuple]
+    _INTS: ClassVar[tuple] = ()
+    _LISTS: ClassVar[tuple] = ()
+    _NESTED: ClassVar[dict] = {}
+
+    @property
+    def key(self) -> str:
+        # Block 0 keeps the bare message id, so entries stored before
+        # messages were segmented are still replaced on re-collection
+        if self.meta.block:
+            return f"{self.meta.message_id}:{self.meta.block}"
+        return str(self.meta.message_id)
+
+    def body(self) -> dict:
+        d = {name: getattr(self, name) for name in self._BODY}
+        for name, part in self._NESTED.items():
+            value = d[name]
+            d[name] = (value or part()).to_dict()
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+    def to_dict(self) -> dict:
+        return {"entry_type": self.entry_type, self.entry_type: self.body(), "meta": self.meta.to_dict()}
+
+    @classmethod
+    def _decode_field(cls, name, value, extra: dict):
+        if name in cls._NESTED:
+            return cls._NESTED[name].from_dict(value or {})
+        if name in cls._INTS:
+            number = to_int(value)
+            if value not in (None, "") and not is_plain_int(value):
+                # Keep what the contributor wrote ("2 - Low", "Low") rather
+                # than dropping everything but the number
+                extra[f"{name}_text"] = value
+            return number
+        if name in cls._LISTS:
+            return to_str_list(value)
+        return value
+
+    @classmethod
+    def from_dict(cls, entry: dict):
+        raw = dict(entry[cls.entry_type])
+        extra = {}
+        kwargs = {}
+        for name in cls._BODY:
+            if name in raw:
+                kwargs[name] = cls._decode_field(name, raw.pop(name), extra)
+        extra.update(raw)
+        return cls(**kwargs, meta=Meta.from_dict(entry["meta"]), extra=extra or None)
+
+
+def _entry(entry_type: str, ints: tuple = (), lists: tuple = (), nested: Optional[dict] = None):
+    def wrap(cls):
+        cls = dataclass(slots=True)(cls)
+        cls.entry_type = entry_type
+        cls._BODY = tuple(f.name for f in fields(cls) if f.name not in ("meta", "extra"))
+        cls._INTS = ints
+        cls._LISTS = lists
+        cls._NESTED = nested or {}
+        return cls
+    return wrap
+
+
+@_entry("system", ints=("planets", "moons"), nested={"economy": Economy, "conflict": Conflict})
+class SystemEntry(_Entry):
+    name: Optional[str] = None
+    classification: Optional[str] = None
+    region: Optional[str] = None
+    special_note: Optional[str] = None
+    code_raw: Optional[str] = None
+    code_hex: Optional[str] = None
+    colour: Optional[str] = None
+    lifeform: Optional[str] = None
+    economy: Optional[Economy] = None
+    conflict: Optional[Conflict] = None
+    planets: Optional[int] = None
+    moons: Optional[int] = None
+    coordinates: Optional[str] = None
+    screenshot_url: Optional[str] = None
+    meta: Optional[Meta] = None
+    extra: Optional[dict] = None
+
+
+@_entry("planet", ints=("sentinel_level",), lists=("resources",))
+class PlanetEntry(_Entry):
+    name: Optional[str] = None
+    type: Optional[str] = None
+    glyphs_raw: Optional[str] = None
+    glyphs_hex: Optional[str] = None
+    resources: Optional[List[str]] = None
+    weather: Optional[str] = None
+    sentinel_level: Optional[int] = None
+    flora: Optional[str] = None
+    fauna: Optional[str] = None
+    special_note: Optional[str] = None
+    screenshot_url: Optional[str] = None
+    meta: Optional[Meta] = None
+    extra: Optional[dict] = None
+
+
+@_entry("flora")
+class FloraEntry(_Entry):
+    name: Optional[str] = None
+    planet: Optional[str] = None
+    star_system: Optional[str] = None
+    galaxy: Optional[str] = None
+    coordinates: Optional[str] = None
+    biome: Optional[str] = None
+    flora_type: Optional[str] = None
+    rarity: Optional[str] = None
+    discovery_date: Optional[str] = None
+    discovered_by: Optional[str] = None
+    description: Optional[str] = None
+    special_note: Optional[str] = None
+    screenshot_url: Optional[str] = None
+    meta: Optional[Meta] = None
+    extra: Optional[dict] = None
+
+
+@_entry("fauna")
+class FaunaEntry(_Entry):
+    name: Optional[str] = None
+    planet: Optional[str] = None
+    star_system: Optional[str] = None
+    galaxy: Optional[str] = None
+    coordinates: Optional[str] = None
+    biome: Optional[str] = None
+    fauna_class: Optional[str] = None
+    temperament: Optional[str] = None
+    activity_pattern: Optional[str] = None
+    rarity: Optional[str] = None
+    discovery_date: Optional[str] = None
+    discovered_by: Optional[str] = None
+    description: Optional[str] = None
+    special_note: Optional[str] = None
+    screenshot_url: Optional[str] = None
+    meta: Optional[Meta] = None
+    extra: Optional[dict] = None
+
+
+@_entry("archaeology", lists=("associated_resources",))
+class ArchaeologyEntry(_Entry):
+    name: Optional[str] = None
+    discovery_type: Optional[str] = None
+    planet: Optional[str] = None
+    star_system: Optional[str] = None
+    galaxy: Optional[str] = None
+    coordinates: Optional[str] = None
+    biome: Optional[str] = None
+    depth_or_location: Optional[str] = None
+    estimated_age: Optional[str] = None
+    rarity: Optional[str] = None
+    discovery_date: Optional[str] = None
+    discovered_by: Optional[str] = None
+    associated_resources: Optional[List[str]] = None
+    description: Optional[str] = None
+    special_note: Optional[str] = None
+    screenshot_url: Optional[str] = None
+    meta: Optional[Meta] = None
+    extra: Optional[dict] = None
+
+
+@_entry("mineral", lists=("primary_yield", "secondary_yield"))
+class MineralEntry(_Entry):
+    name: Optional[str] = None
+    mineral_type: Optional[str] = None
+    planet: Optional[str] = None
+    star_system: Optional[str] = None
+    galaxy: Optional[str] = None
+    coordinates: Optional[str] = None
+    biome: Optional[str] = None
+    formation_type: Optional[str] = None
+    primary_yield: Optional[List[str]] = None
+    secondary_yield: Optional[List[str]] = None
+    rarity: Optional[str] = None
+    discovery_date: Optional[str] = None
+    discovered_by: Optional[str] = None
+    description: Optional[str] = None
+    special_note: Optional[str] = None
+    screenshot_url: Optional[str] = None
+    meta: Optional[Meta] = None
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class Quarantined:
+    """A message that was not parsed because it hit a parse limit."""
+    thread_id: int
+    message_id: int
+    reason: str
+
+    @property
+    def key(self) -> str:
+        return str(self.message_id)
+
+    def to_dict(self) -> dict:
+        return {"thread_id": self.thread_id, "message_id": self.message_id, "reason": self.reason}
+
+
+ENTRY_CLASSES = {
+    cls.entry_type: cls
+    for cls in (SystemEntry, PlanetEntry, FloraEntry, FaunaEntry, ArchaeologyEntry, MineralEntry)
+}
+
+
+def from_dict(entry: dict):
+    """Build a typed record from a parser result or an exported entry."""
+    return ENTRY_CLASSES[entry["entry_type"]].from_dict(entry)
+
+
+# -----------------------------
+# Encoding
+# -----------------------------
+def encode(obj):
+    """Turn records (or lists of them) into plain JSON-ready structures; dicts pass through."""
+    if isinstance(obj, (_Entry, Quarantined)):
+        return obj.to_dict()
+    if isinstance(obj, (list, tuple)):
+        return [encode(o) for o in obj]
+    return obj
+
+
+def dumps(obj) -> bytes:
+    """Fast JSON encoding shared by the exporter and the dispatcher."""
+    data = encode(obj)
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
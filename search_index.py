@@ -0,0 +1,259 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from itertools import islice
+from typing import List, Optional
+
+from parser import normalize_line, strip_emojis
+
+
+INDEX_PATH = os.getenv("VHC_SEARCH_INDEX", "search_index.jsonl")
+NAME_WEIGHT = 3
+# Compact the journal (on load or flush) once superseded lines outnumber live documents
+COMPACT_RATIO = 2.0
+
+# Fields that hold addresses or links rather than searchable text
+SKIP_FIELDS = {
+    "screenshot_url", "code_raw", "code_hex", "glyphs_raw", "glyphs_hex", "coordinates",
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Posting lists longer than this only rescore documents the rarer query terms
+# already matched (or, if none did, this many of their documents)
+MAX_POSTINGS_WALK = int(os.getenv("VHC_SEARCH_MAX_POSTINGS", "5000"))
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+
+
+# -----------------------------
+# Tokenization
+# -----------------------------
+def tokenize(text: Optional[str]) -> List[str]:
+    """Same cleanup the parsers apply to field values, then lower-cased word tokens."""
+    if not text:
+        return []
+    clean = strip_emojis(normalize_line(text)) or ""
+    return _TOKEN_RE.findall(clean.lower())
+
+
+def record_terms(record) -> Counter:
+    terms = Counter()
+    for key, value in record.body().items():
+        if key in SKIP_FIELDS or value is None:
+            continue
+        if isinstance(value, dict):
+            value = " ".join(str(v) for v in value.values() if v is not None)
+        elif isinstance(value, list):
+            value = " ".join(str(v) for v in value if v)
+        elif not isinstance(value, str):
+            continue
+        weight = NAME_WEIGHT if key == "name" else 1
+        for token in tokenize(value):
+            terms[token] += weight
+    return terms
+
+
+# -----------------------------
+# Inverted index
+# -----------------------------
+class SearchHit:
+    __slots__ = ("key", "score", "entry_type", "name", "thread_id", "message_id")
+
+    def __init__(self, key, score, doc):
+        self.key = key
+        self.score = score
+        self.entry_type = doc["type"]
+        self.name = doc["name"]
+        self.thread_id = doc["thread_id"]
+        self.message_id = doc["message_id"]
+
+    def __repr__(self):
+        return f"SearchHit({self.entry_type} {self.name!r} score={self.score:.2f})"
+
+
+class SearchIndex:
+    """
+    In-memory inverted index (guild -> token -> {doc key: term frequency})
+    ranked with BM25. Changes are appended to a JSON-lines journal on
+    flush(), so adding entries never rewrites the whole index; loading
+    replays the journal.
+
+    Every query is scoped to one guild, and BM25 statistics are per guild.
+
+    Collections update the index from an executor thread while commands
+    query it, so every public method holds `lock`.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.docs = {}
+        self.postings = {}
+        self.threads = {}
+        self._guild_docs = Counter()
+        self._guild_len = Counter()
+        self._pending = []
+        self._journal_lines = 0
+
+    # ---- building ----
+    def _remove(self, key: str):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        guild_id = doc["guild_id"]
+        self._guild_docs[guild_id] -= 1
+        self._guild_len[guild_id] -= doc["len"]
+        postings = self.postings[guild_id]
+        for token in doc["terms"]:
+            bucket = postings.get(token)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del postings[token]
+        keys = self.threads.get(doc["thread_id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.threads[doc["thread_id"]]
+
+    def _insert(self, key: str, doc: dict):
+        self._remove(key)
+        self.docs[key] = doc
+        guild_id = doc["guild_id"]
+        self._guild_docs[guild_id] += 1
+        self._guild_len[guild_id] += doc["len"]
+        postings = self.postings.setdefault(guild_id, {})
+        for token, tf in doc["terms"].items():
+            postings.setdefault(token, {})[key] = tf
+        self.threads.setdefault(doc["thread_id"], set()).add(key)
+
+    def add(self, record, guild_id: int, terms: Optional[dict] = None):
+        """`terms` is record_terms(record) when the caller already has it (see workers.parse_chunk)."""
+        if terms is None:
+            terms = record_terms(record)
+        doc = {
+            "type": record.entry_type,
+            "name": getattr(record, "name", None),
+            "guild_id": guild_id,
+            "thread_id": record.meta.thread_id,
+            "message_id": record.meta.message_id,
+            "len": sum(terms.values()),
+            "terms": dict(terms),
+        }
+        with self.lock:
+            # Re-collecting a thread mostly re-adds identical documents; keep them out of the journal
+            if self.docs.get(record.key) == doc:
+                return
+            self._insert(record.key, doc)
+            self._pending.append({"key": record.key, **doc})
+
+    def retire_missing(self, thread_id: int, keep) -> int:
+        """Drop a re-collected thread's documents whose key is not in `keep` (deleted messages, vanished blocks)."""
+        with self.lock:
+            stale = self.threads.get(thread_id, set()) - set(keep)
+            for key in stale:
+                self._remove(key)
+                self._pending.append({"key": key, "deleted": True})
+            return len(stale)
+
+    # ---- persistence ----
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with self.lock, open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                doc = json.loads(line)
+                key = doc.pop("key")
+                if doc.get("deleted"):
+                    self._remove(key)
+                else:
+                    self._insert(key, doc)
+                self._journal_lines += 1
+            self._compact_if_stale()
+        return self
+
+    def _compact_if_stale(self):
+        if self._journal_lines > COMPACT_RATIO * max(len(self.docs), 1):
+            self.compact()
+
+    def flush(self):
+        with self.lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            with open(self.path, "a", encoding="utf-8") as f:
+                for doc in pending:
+                    f.write(json.dumps(doc, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._journal_lines += len(pending)
+            self._compact_if_stale()
+
+    def compact(self):
+        tmp = self.path + ".tmp"
+        with self.lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for key, doc in self.docs.items():
+                    f.write(json.dumps({"key": key, **doc}, ensure_ascii=False, separators=(",", ":")) + "\n")
+            os.replace(tmp, self.path)
+            self._journal_lines = len(self.docs)
+            self._pending = []
+
+    # ---- querying ----
+    def search(self, query: str, guild_id: int, entry_type: Optional[str] = None,
+               limit: int = 10) -> List[SearchHit]:
+        tokens = set(tokenize(query))
+        with self.lock:
+            return self._search(tokens, guild_id, entry_type, limit)
+
+    def _search(self, tokens: set, guild_id: int, entry_type: Optional[str], limit: int) -> List[SearchHit]:
+        postings = self.postings.get(guild_id)
+        if not tokens or not postings:
+            return []
+        n = self._guild_docs[guild_id]
+        avg_len = self._guild_len[guild_id] / n or 1.0
+        scores = {}
+        buckets = sorted((postings[t] for t in tokens if t in postings), key=len)
+        for bucket in buckets:
+            idf = math.log(1 + (n - len(bucket) + 0.5) / (len(bucket) + 0.5))
+            if len(bucket) <= MAX_POSTINGS_WALK:
+                matches = bucket.items()
+            elif scores:
+                matches = [(key, bucket[key]) for key in list(scores) if key in bucket]
+            else:
+                # Filter by type before capping, or a common word could come back empty
+                matches = islice(
+                    ((key, tf) for key, tf in bucket.items()
+                     if not entry_type or self.docs[key]["type"] == entry_type),
+                    MAX_POSTINGS_WALK,
+                )
+            for key, tf in matches:
+                doc = self.docs[key]
+                if entry_type and doc["type"] != entry_type:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc["len"] / avg_len)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [SearchHit(key, score, self.docs[key]) for key, score in best]
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SearchIndex:
+    """Process-wide index, loaded from disk on first use (from any thread)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex().load()
+    return _index
+
+
+def search(query: str, guild_id: int, entry_type: Optional[str] = None, limit: int = 10) -> List[SearchHit]:
+    return get_index().search(query, guild_id, entry_type=entry_type, limit=limit)
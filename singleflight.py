@@ -0,0 +1,48 @@
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    At most one in-flight value per key, plus a short-lived cache of
+    finished ones. Callers look a key up first and attach to whatever
+    they get back; only a miss should start new work.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._inflight: Dict[Hashable, Any] = {}
+        self._done: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._inflight.get(key)
+        if value is not None:
+            return value
+        cached = self._done.get(key)
+        if cached is None:
+            return None
+        expires, value = cached
+        if time.monotonic() >= expires:
+            del self._done[key]
+            return None
+        return value
+
+    def start(self, key: Hashable, value: Any):
+        self._done.pop(key, None)
+        self._inflight[key] = value
+
+    def finish(self, key: Hashable, value: Any, cache: bool = True):
+        if self._inflight.get(key) is value:
+            del self._inflight[key]
+        if cache and self.ttl > 0:
+            self._done[key] = (time.monotonic() + self.ttl, value)
+        self._evict()
+
+    def forget(self, key: Hashable):
+        self._inflight.pop(key, None)
+        self._done.pop(key, None)
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._done.items() if expires <= now]:
+            del self._done[key]
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import time
+
+
+FINGERPRINT_FILE = os.getenv("VHC_COMMAND_FINGERPRINT_FILE", ".command_tree.sha256")
+
+
+# -----------------------------
+# Command tree fingerprint
+# -----------------------------
+def _command_payload(command, tree) -> dict:
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        # discord.py < 2.4 builds the payload without the tree
+        return command.to_dict()
+
+
+def command_tree_fingerprint(tree, application_id=None) -> str:
+    payload = sorted(
+        (_command_payload(c, tree) for c in tree.get_commands()),
+        key=lambda d: (d.get("type", 1), d.get("name", ""))
+    )
+    blob = json.dumps({"app": application_id, "commands": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _read_fingerprint() -> str:
+    try:
+        with open(FINGERPRINT_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _write_fingerprint(value: str):
+    tmp = FINGERPRINT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(value)
+    os.replace(tmp, FINGERPRINT_FILE)
+
+
+async def sync_if_changed(bot, force: bool = False):
+    """
+    Sync the global command tree only when its payload differs from the
+    last successful sync. Returns the synced commands, or None if skipped.
+    """
+    fingerprint = command_tree_fingerprint(bot.tree, bot.application_id)
+    if not force and fingerprint == _read_fingerprint():
+        return None
+    synced = await bot.tree.sync()
+    _write_fingerprint(fingerprint)
+    return synced
+
+
+# -----------------------------
+# Startup timing
+# -----------------------------
+class StartupTimer:
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.marks = []
+        self.reported = False
+
+    def mark(self, label: str):
+        self.marks.append((label, time.perf_counter()))
+
+    def report(self) -> str:
+        self.reported = True
+        lines = ["Startup timing:"]
+        previous = self.started_at
+        for label, at in self.marks:
+            lines.append(f"  {label:<18} +{(at - previous) * 1000:8.1f} ms  (t={(at - self.started_at) * 1000:.1f} ms)")
+            previous = at
+        return "\n".join(lines)
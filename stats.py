@@ -0,0 +1,376 @@
+import json
+import os
+import threading
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+
+STATS_PATH = os.getenv("VHC_STATS_STORE", "stats_store.npz")
+STATS_JSON_PATH = os.getenv("VHC_STATS_JSON", "stats.json")
+
+# Conflict levels live in an int32 column; anything outside it is not a level
+MAX_CONFLICT_LEVEL = np.iinfo(np.int32).max
+
+DIMENSIONS = (
+    "entries_by_type",
+    "systems_by_region",
+    "economy_type",
+    "economy_status",
+    "conflict_level",
+    "planet_resources",
+)
+
+
+# -----------------------------
+# Columnar storage
+# -----------------------------
+class _Vocab:
+    """Category labels <-> dense int codes. Case/whitespace variants share a code."""
+
+    def __init__(self, labels=None):
+        self.labels = []
+        self._codes = {}
+        for label in labels or []:
+            self.code(label)
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+        label = str(value).strip()
+        if not label:
+            return -1
+        norm = label.casefold()
+        code = self._codes.get(norm)
+        if code is None:
+            code = len(self.labels)
+            self._codes[norm] = code
+            self.labels.append(label)
+        return code
+
+
+class _Column:
+    """Growable int32 (or `dtype`) array; append is amortised O(1)."""
+
+    def __init__(self, data=None, dtype=np.int32):
+        if data is None:
+            self.data = np.empty(64, dtype=dtype)
+            self.size = 0
+        else:
+            self.data = np.array(data, dtype=dtype)
+            self.size = len(self.data)
+
+    def append(self, value: int) -> int:
+        if self.size == len(self.data):
+            self.data = np.resize(self.data, max(64, self.size * 2))
+        self.data[self.size] = value
+        self.size += 1
+        return self.size - 1
+
+    def view(self):
+        return self.data[:self.size]
+
+
+# -----------------------------
+# Aggregates
+# -----------------------------
+class StatsEngine:
+    """
+    Running aggregates over committed entries.
+
+    Every entry appends a row to NumPy columns (guild, thread, region,
+    economy, conflict level, one row per planet resource) and bumps its
+    guild's running Counters, so reads are instant. A row re-collected under
+    the same key with different values, or missing when its thread is
+    collected again, is marked dead and its counts are taken back; dead rows
+    are compacted away once they outnumber live ones. recompute() rebuilds
+    every aggregate from the live rows with bincount, e.g. after loading or
+    to check drift. Collections update the engine from an executor thread,
+    so the public methods hold `lock`.
+    """
+
+    def __init__(self, path: str = STATS_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.vocab = {name: _Vocab() for name in ("type", "region", "economy_type", "economy_status", "resource")}
+        # one row per entry
+        self.guild = _Column(dtype=np.int64)
+        self.thread = _Column(dtype=np.int64)
+        self.entry_type = _Column()
+        self.region = _Column()
+        self.economy_type = _Column()
+        self.economy_status = _Column()
+        self.conflict_level = _Column()
+        self.alive = _Column()
+        # one row per (planet entry, resource)
+        self.resource = _Column()
+        self.resource_owner = _Column()
+        self.keys = {}
+        self.threads = {}
+        self._resource_rows = {}
+        # guild id -> dimension -> Counter
+        self.counts = {}
+        self._dirty = False
+
+    # ---- updates ----
+    def _row_counts(self, row: int):
+        """Yield (dimension, label) pairs one entry row contributes."""
+        yield "entries_by_type", self.vocab["type"].labels[self.entry_type.data[row]]
+        for dim, column, vocab in (
+            ("systems_by_region", self.region, "region"),
+            ("economy_type", self.economy_type, "economy_type"),
+            ("economy_status", self.economy_status, "economy_status"),
+        ):
+            code = column.data[row]
+            if code >= 0:
+                yield dim, self.vocab[vocab].labels[code]
+        level = self.conflict_level.data[row]
+        if level >= 0:
+            yield "conflict_level", str(level)
+        for r in self._resource_rows.get(row, ()):
+            yield "planet_resources", self.vocab["resource"].labels[self.resource.data[r]]
+
+    def _guild_counts(self, guild_id: int) -> dict:
+        counts = self.counts.get(guild_id)
+        if counts is None:
+            counts = self.counts[guild_id] = {name: Counter() for name in DIMENSIONS}
+        return counts
+
+    def _retire(self, key: str):
+        row = self.keys.pop(key, None)
+        if row is None:
+            return
+        counts = self._guild_counts(int(self.guild.data[row]))
+        for dim, label in self._row_counts(row):
+            counts[dim][label] -= 1
+            if counts[dim][label] <= 0:
+                del counts[dim][label]
+        self.alive.data[row] = 0
+        self._resource_rows.pop(row, None)
+        self._dirty = True
+        thread_id = int(self.thread.data[row])
+        keys = self.threads.get(thread_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.threads[thread_id]
+
+    def add(self, record, guild_id: int):
+        with self.lock:
+            self._add(record, guild_id)
+
+    def retire_missing(self, thread_id: int, keep) -> int:
+        """Take back the rows of a re-collected thread whose key is not in `keep`."""
+        with self.lock:
+            stale = self.threads.get(thread_id, set()) - set(keep)
+            for key in stale:
+                self._retire(key)
+            return len(stale)
+
+    def _row_columns(self) -> tuple:
+        return (self.guild, self.thread, self.entry_type, self.region, self.economy_type,
+                self.economy_status, self.conflict_level, self.alive)
+
+    def _row_values(self, record, guild_id: int):
+        """(values for _row_columns(), resource codes) for one record."""
+        region = economy_type = economy_status = -1
+        level = -1
+        if record.entry_type == "system":
+            region = self.vocab["region"].code(record.region)
+            if record.economy:
+                economy_type = self.vocab["economy_type"].code(record.economy.type)
+                economy_status = self.vocab["economy_status"].code(record.economy.status)
+            if record.conflict and record.conflict.level is not None:
+                level = record.conflict.level
+                if not 0 <= level <= MAX_CONFLICT_LEVEL:
+                    level = -1
+
+        resources = []
+        if record.entry_type == "planet":
+            resources = [code for code in map(self.vocab["resource"].code, record.resources or ()) if code >= 0]
+        values = (guild_id, record.meta.thread_id, self.vocab["type"].code(record.entry_type),
+                  region, economy_type, economy_status, level, 1)
+        return values, resources
+
+    def _unchanged(self, row: Optional[int], values: tuple, resources: list) -> bool:
+        if row is None:
+            return False
+        if any(column.data[row] != value for column, value in zip(self._row_columns(), values)):
+            return False
+        return [self.resource.data[r] for r in self._resource_rows.get(row, ())] == resources
+
+    def _add(self, record, guild_id: int):
+        values, resources = self._row_values(record, guild_id)
+        if self._unchanged(self.keys.get(record.key), values, resources):
+            return
+        self._retire(record.key)
+
+        # All columns grow together or not at all
+        row, resource_size = self.entry_type.size, self.resource.size
+        try:
+            for column, value in zip(self._row_columns(), values):
+                column.append(value)
+            rows = []
+            for code in resources:
+                self.resource.append(code)
+                rows.append(self.resource_owner.append(row))
+        except Exception:
+            for column in self._row_columns():
+                column.size = row
+            self.resource.size = self.resource_owner.size = resource_size
+            raise
+        if rows:
+            self._resource_rows[row] = rows
+        self.keys[record.key] = row
+        self.threads.setdefault(record.meta.thread_id, set()).add(record.key)
+        self._dirty = True
+
+        counts = self._guild_counts(guild_id)
+        for dim, label in self._row_counts(row):
+            counts[dim][label] += 1
+
+    # ---- reads ----
+    def summary(self, guild_id: int, top: Optional[int] = None) -> dict:
+        with self.lock:
+            counts = self.counts.get(guild_id, {})
+            return {dim: dict(counts.get(dim, Counter()).most_common(top)) for dim in DIMENSIONS}
+
+    def _bincount(self, column: _Column, vocab: str, mask) -> Counter:
+        codes = column.view()[mask]
+        codes = codes[codes >= 0]
+        labels = self.vocab[vocab].labels
+        counts = np.bincount(codes, minlength=len(labels))
+        return Counter({labels[i]: int(counts[i]) for i in np.flatnonzero(counts)})
+
+    def recompute(self) -> dict:
+        with self.lock:
+            return self._recompute()
+
+    def _recompute(self) -> dict:
+        alive = self.alive.view().astype(bool)
+        guilds = self.guild.view()
+        self.counts = {
+            guild_id: self._mask_counts(alive & (guilds == guild_id))
+            for guild_id in np.unique(guilds[alive]).tolist()
+        }
+        return {guild_id: self.summary(guild_id) for guild_id in self.counts}
+
+    def _mask_counts(self, alive) -> dict:
+        system_code = self.vocab["type"]._codes.get("system", -2)
+        systems = alive & (self.entry_type.view() == system_code)
+
+        counts = {
+            "entries_by_type": self._bincount(self.entry_type, "type", alive),
+            "systems_by_region": self._bincount(self.region, "region", systems),
+            "economy_type": self._bincount(self.economy_type, "economy_type", systems),
+            "economy_status": self._bincount(self.economy_status, "economy_status", systems),
+        }
+
+        levels = self.conflict_level.view()[systems]
+        levels = levels[levels >= 0]
+        values, freq = np.unique(levels, return_counts=True)
+        counts["conflict_level"] = Counter({str(v): int(c) for v, c in zip(values, freq)})
+
+        owners = self.resource_owner.view()
+        resource_alive = alive[owners] if len(owners) else np.zeros(0, dtype=bool)
+        counts["planet_resources"] = self._bincount(self.resource, "resource", resource_alive)
+        return counts
+
+    def _compact(self):
+        """Drop dead rows once they outnumber live ones; counts are unaffected."""
+        if self.entry_type.size - len(self.keys) <= len(self.keys):
+            return
+        alive = self.alive.view().astype(bool)
+        keep = np.flatnonzero(alive)
+        remap = np.full(self.entry_type.size, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        for column in self._row_columns():
+            column.data = column.view()[keep]
+            column.size = len(keep)
+
+        owners = self.resource_owner.view()
+        owned = np.flatnonzero(alive[owners]) if len(owners) else np.zeros(0, dtype=np.int64)
+        self.resource.data = self.resource.view()[owned]
+        self.resource_owner.data = remap[owners[owned]].astype(np.int32)
+        self.resource.size = self.resource_owner.size = len(owned)
+
+        self.keys = {key: int(remap[row]) for key, row in self.keys.items()}
+        self._index_resources()
+
+    def _index_resources(self):
+        self._resource_rows = {}
+        for r, owner in enumerate(self.resource_owner.view().tolist()):
+            self._resource_rows.setdefault(owner, []).append(r)
+
+    # ---- persistence ----
+    def save(self):
+        """Write the store if anything changed since it was loaded or last saved."""
+        # Collections in different guilds can finish together; they share the tmp path
+        tmp = self.path + ".tmp.npz"
+        with self.lock:
+            if not self._dirty and os.path.exists(self.path):
+                return
+            self._compact()
+            self._save(tmp)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def _save(self, tmp: str):
+        np.savez_compressed(
+            tmp,
+            guild=self.guild.view(),
+            thread=self.thread.view(),
+            entry_type=self.entry_type.view(),
+            region=self.region.view(),
+            economy_type=self.economy_type.view(),
+            economy_status=self.economy_status.view(),
+            conflict_level=self.conflict_level.view(),
+            alive=self.alive.view(),
+            resource=self.resource.view(),
+            resource_owner=self.resource_owner.view(),
+            vocab=np.array(json.dumps({name: v.labels for name, v in self.vocab.items()})),
+            keys=np.array(json.dumps(self.keys)),
+        )
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with self.lock, np.load(self.path) as data:
+            self.vocab = {name: _Vocab(labels) for name, labels in json.loads(str(data["vocab"])).items()}
+            for name in ("entry_type", "region", "economy_type", "economy_status", "conflict_level",
+                         "alive", "resource", "resource_owner"):
+                setattr(self, name, _Column(data[name]))
+            for name in ("guild", "thread"):
+                setattr(self, name, _Column(data[name], dtype=np.int64))
+            self.keys = json.loads(str(data["keys"]))
+            self.threads = {}
+            for key, row in self.keys.items():
+                self.threads.setdefault(int(self.thread.data[row]), set()).add(key)
+            self._index_resources()
+            self._compact()
+            self._recompute()
+            self._dirty = False
+        return self
+
+    def dump_json(self, path: str = STATS_JSON_PATH):
+        """Every guild's summary, keyed by guild id."""
+        tmp = path + ".tmp"
+        with self.lock:
+            summaries = {str(guild_id): self.summary(guild_id) for guild_id in self.counts}
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(summaries, f, indent=4, ensure_ascii=False)
+            os.replace(tmp, path)
+
+
+_engine: Optional[StatsEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_stats() -> StatsEngine:
+    """Process-wide engine, loaded from disk on first use (from any thread)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = StatsEngine().load()
+    return _engine
@@ -0,0 +1,387 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+
+TEMPLATES_PATH = os.getenv("VHC_TEMPLATES", "templates.json")
+RELOAD_CHECK_INTERVAL = float(os.getenv("VHC_TEMPLATES_RELOAD_INTERVAL", "2"))
+
+
+# -----------------------------
+# Built-in definitions
+# -----------------------------
+# Markers decide which template a message is (checked in this type order).
+# Field labels are what each parser looks for on a line, case-insensitively;
+# field order is the order the parser tests them in, so it also decides
+# which field wins when a line matches several.
+DEFAULT_TEMPLATES = {
+    "system": {
+        "markers": ["System Colour", "System Color", "System classification"],
+        "fields": {
+            "name": ["System Name"],
+            "region": ["Region"],
+            "classification": ["System classification"],
+            "special_note": ["Special Note"],
+            "code": ["System Code"],
+            "colour": ["System Colour", "System Color"],
+            "lifeform": ["Dominant Lifeform"],
+            "economy": ["Economy"],
+            "conflict": ["Conflict"],
+            "planets": ["Number of Planets"],
+            "coordinates": ["System Coordinates"],
+            "screenshot": ["Screenshot"],
+        },
+    },
+    "planet": {
+        "markers": ["Planet Type", "Planet Glyphs"],
+        "fields": {
+            "name": ["Planet Name", "Name"],
+            "type": ["Planet Type", "Type"],
+            "glyphs": ["Planet Glyphs", "Glyphs"],
+            "resources": ["Resources"],
+            "weather": ["Weather"],
+            "sentinel_level": ["Sentinel Level", "Sentinal Level"],
+            "flora": ["Flora"],
+            "fauna": ["Fauna"],
+            "special_note": ["Special Note"],
+            "screenshot": ["Screenshot"],
+        },
+    },
+    "flora": {
+        "markers": ["Flora Type"],
+        "fields": {
+            "name": ["Name"],
+            "planet": ["Planet"],
+            "star_system": ["Star System"],
+            "galaxy": ["Galaxy"],
+            "coordinates": ["Coordinates"],
+            "biome": ["Biome"],
+            "flora_type": ["Flora Type"],
+            "rarity": ["Rarity"],
+            "discovery_date": ["Discovery Date"],
+            "discovered_by": ["Discovered By"],
+            "description": ["Description", "Description / Notes"],
+            "special_note": ["Special Note"],
+            "screenshot": ["Screenshot"],
+        },
+    },
+    "fauna": {
+        "markers": ["Fauna Class"],
+        "fields": {
+            "name": ["Name"],
+            "planet": ["Planet"],
+            "star_system": ["Star System"],
+            "galaxy": ["Galaxy"],
+            "coordinates": ["Coordinates"],
+            "biome": ["Biome"],
+            "fauna_class": ["Fauna Class"],
+            "temperament": ["Temperament"],
+            "activity_pattern": ["Activity Pattern"],
+            "rarity": ["Rarity"],
+            "discovery_date": ["Discovery Date"],
+            "discovered_by": ["Discovered By"],
+            "description": ["Description", "Description / Notes"],
+            "special_note": ["Special Note"],
+            "screenshot": ["Screenshot"],
+        },
+    },
+    "archaeology": {
+        "markers": ["Discovery Type", "Associated Resources"],
+        "fields": {
+            "name": ["Name"],
+            "discovery_type": ["Discovery Type"],
+            "planet": ["Planet"],
+            "star_system": ["Star System"],
+            "galaxy": ["Galaxy"],
+            "coordinates": ["Coordinates"],
+            "biome": ["Biome"],
+            "depth_or_location": ["Depth", "Depth or Location"],
+            "estimated_age": ["Estimated Age", "Estimated Age / Classification"],
+            "rarity": ["Rarity"],
+            "discovery_date": ["Discovery Date"],
+            "discovered_by": ["Discovered By"],
+            "associated_resources": ["Associated Resources"],
+            "description": ["Description", "Description / Notes"],
+            "special_note": ["Special Note"],
+            "screenshot": ["Screenshot"],
+        },
+    },
+    "mineral": {
+        "markers": ["Mineral Type", "Primary Resource Yield"],
+        "fields": {
+            "name": ["Name"],
+            "mineral_type": ["Mineral Type"],
+            "planet": ["Planet"],
+            "star_system": ["Star System"],
+            "galaxy": ["Galaxy"],
+            "coordinates": ["Coordinates"],
+            "biome": ["Biome"],
+            "formation_type": ["Formation Type"],
+            "primary_yield": ["Primary Resource Yield"],
+            "secondary_yield": ["Secondary Resource Yield"],
+            "rarity": ["Rarity"],
+            "discovery_date": ["Discovery Date"],
+            "discovered_by": ["Discovered By"],
+            "description": ["Description", "Description / Notes"],
+            "special_note": ["Special Note"],
+            "screenshot": ["Screenshot"],
+        },
+    },
+}
+
+TYPE_ORDER = tuple(DEFAULT_TEMPLATES)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+# -----------------------------
+# Compiled form
+# -----------------------------
+class CompiledType:
+    __slots__ = ("name", "fields", "key_fields")
+
+    def __init__(self, name: str, fields: Dict[str, tuple], markers: tuple = ()):
+        self.name = name
+        self.fields = fields
+        # Fields that occur once per entry: the name and any field whose label
+        # is also a type marker. Seeing one twice means a second entry began.
+        self.key_fields = tuple(
+            f for f, labels in fields.items()
+            if f == "name" or any(l in markers for l in labels)
+        )
+
+    def has(self, lower_line: str, field: str) -> bool:
+        """`lower_line` must already be lower-cased (once per line, not per check)."""
+        for label in self.fields[field]:
+            if label in lower_line:
+                return True
+        return False
+
+    def key_field(self, lower_header: str) -> Optional[str]:
+        """
+        The key field a lower-cased "Label" (the text before a line's colon)
+        starts with, if any. Stricter than has(), so "Weather Type" is not
+        mistaken for a planet's "Type".
+        """
+        for field in self.key_fields:
+            for label in self.fields[field]:
+                if lower_header.startswith(label):
+                    return field
+        return None
+
+
+class CompiledTemplates:
+    """
+    One guild's template set: a single alternation regex for type detection
+    plus pre-lowered label tuples per field. Immutable once built.
+    """
+    __slots__ = ("types", "_detector", "_priority")
+
+    def __init__(self, types: Dict[str, CompiledType], markers: Dict[str, tuple]):
+        self.types = types
+        parts = []
+        for n, name in enumerate(TYPE_ORDER):
+            alternation = "|".join(re.escape(m) for m in sorted(markers[name], key=len, reverse=True))
+            parts.append(f"(?P<t{n}>{alternation})")
+        self._detector = re.compile("|".join(parts))
+        self._priority = {f"t{n}": (n, name) for n, name in enumerate(TYPE_ORDER)}
+
+    def __getitem__(self, entry_type: str) -> CompiledType:
+        return self.types[entry_type]
+
+    def detect(self, lower_text: str) -> Optional[str]:
+        best = None
+        for m in self._detector.finditer(lower_text):
+            rank, name = self._priority[m.lastgroup]
+            if rank == 0:
+                return name
+            if best is None or rank < best[0]:
+                best = (rank, name)
+        return best[1] if best else None
+
+
+def _labels(value, where: str) -> list:
+    """A label list from the config; a single string counts as one label."""
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list) or not all(isinstance(label, str) for label in value):
+        raise TemplateError(f"{where} must be a string or a list of strings")
+    return list(value)
+
+
+def _mapping(value, where: str) -> dict:
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise TemplateError(f"{where} must be an object")
+    return value
+
+
+def merge_definitions(base: dict, override: Optional[dict], where: str = "default") -> dict:
+    merged = copy.deepcopy(base)
+    for entry_type, spec in _mapping(override, where).items():
+        if entry_type not in merged:
+            raise TemplateError(f"unknown template type {entry_type!r}")
+        spec = _mapping(spec, entry_type)
+        if "markers" in spec:
+            merged[entry_type]["markers"] = _labels(spec["markers"], f"{entry_type}.markers")
+        for field, labels in _mapping(spec.get("fields"), f"{entry_type}.fields").items():
+            if field not in merged[entry_type]["fields"]:
+                raise TemplateError(f"{entry_type}: unknown field {field!r}")
+            merged[entry_type]["fields"][field] = _labels(labels, f"{entry_type}.{field}")
+    return merged
+
+
+def validate(definitions: dict):
+    """
+    Reject label sets the line-by-line parsers would resolve ambiguously:
+    empty labels, a label claimed by two fields, a field whose label contains
+    an earlier field's label (the earlier field always wins, so the later one
+    can never match), and the same overlaps between type markers.
+    """
+    problems = []
+
+    seen_markers = []
+    for entry_type in TYPE_ORDER:
+        markers = [m.strip().lower() for m in definitions[entry_type]["markers"]]
+        if not markers or not all(markers):
+            problems.append(f"{entry_type}: markers must be non-empty")
+        for marker in markers:
+            for other_type, other in seen_markers:
+                if other_type != entry_type and other in marker:
+                    problems.append(
+                        f"marker {marker!r} ({entry_type}) also matches {other_type} marker {other!r}; "
+                        f"those messages would be detected as {other_type}"
+                    )
+        seen_markers.extend((entry_type, m) for m in markers)
+
+        seen_labels = []
+        for field, labels in definitions[entry_type]["fields"].items():
+            lowered = [l.strip().lower() for l in labels]
+            if not lowered or not all(lowered):
+                problems.append(f"{entry_type}.{field}: labels must be non-empty")
+            for label in lowered:
+                for other_field, other in seen_labels:
+                    if other_field == field:
+                        continue
+                    if other == label:
+                        problems.append(f"{entry_type}: label {label!r} is used by both {other_field} and {field}")
+                    elif other in label:
+                        problems.append(
+                            f"{entry_type}.{field}: label {label!r} contains {other_field} label {other!r}, "
+                            f"so it can never match"
+                        )
+            seen_labels.extend((field, l) for l in lowered)
+
+    if problems:
+        raise TemplateError("; ".join(problems))
+
+
+def compile_templates(definitions: dict) -> CompiledTemplates:
+    validate(definitions)
+    types = {}
+    markers = {}
+    for entry_type in TYPE_ORDER:
+        spec = definitions[entry_type]
+        markers[entry_type] = tuple(m.strip().lower() for m in spec["markers"])
+        types[entry_type] = CompiledType(
+            entry_type,
+            {field: tuple(dict.fromkeys(l.strip().lower() for l in labels)) for field, labels in spec["fields"].items()},
+            markers[entry_type],
+        )
+    return CompiledTemplates(types, markers)
+
+
+# -----------------------------
+# Per-guild registry with hot reload
+# -----------------------------
+class TemplateRegistry:
+    """
+    Compiled templates per guild, built from the built-in definitions plus
+    the config file:
+
+        {"default": {<type>: {"markers": [...], "fields": {<field>: [...]}}},
+         "guilds": {"<guild id>": {<type>: {...}}}}
+
+    Guild entries override the (overridden) defaults field by field. The
+    file's mtime is checked at most every RELOAD_CHECK_INTERVAL seconds; a
+    changed file is compiled in full and swapped in with one assignment, and
+    a file that fails validation is reported and ignored.
+    """
+
+    def __init__(self, path: str = TEMPLATES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._default = compile_templates(DEFAULT_TEMPLATES)
+        self._compiled = {}
+        self._guild_defaults = self._default
+        self.reload(force=True)
+
+    def _read_config(self) -> dict:
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def reload(self, force: bool = False) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if not force and mtime == self._mtime:
+            return False
+
+        with self._lock:
+            if mtime is None:
+                default, guilds = self._default, {}
+            else:
+                try:
+                    config = _mapping(self._read_config(), self.path)
+                    base = merge_definitions(DEFAULT_TEMPLATES, config.get("default"))
+                    default = compile_templates(base)
+                    guilds = {
+                        int(guild_id): compile_templates(merge_definitions(base, spec, f"guilds.{guild_id}"))
+                        for guild_id, spec in _mapping(config.get("guilds"), "guilds").items()
+                    }
+                except (OSError, ValueError, TypeError, AttributeError) as e:
+                    print(f"[TEMPLATES] keeping previous templates; {self.path} is invalid: {e}")
+                    self._mtime = mtime
+                    return False
+            # Swap both references; readers see either the old set or the new one
+            self._guild_defaults, self._compiled = default, guilds
+            self._mtime = mtime
+        if mtime is not None:
+            print(f"[TEMPLATES] loaded {self.path} ({len(guilds)} guild override(s))")
+        return True
+
+    def get(self, guild_id: Optional[int] = None) -> CompiledTemplates:
+        now = time.monotonic()
+        if now - self._checked_at >= RELOAD_CHECK_INTERVAL:
+            self._checked_at = now
+            self.reload()
+        return self._compiled.get(guild_id, self._guild_defaults)
+
+
+_registry: Optional[TemplateRegistry] = None
+_default_compiled: Optional[CompiledTemplates] = None
+
+
+def get_registry() -> TemplateRegistry:
+    global _registry
+    if _registry is None:
+        _registry = TemplateRegistry()
+    return _registry
+
+
+def default_templates() -> CompiledTemplates:
+    """The built-in definitions, compiled once (no config file involved)."""
+    global _default_compiled
+    if _default_compiled is None:
+        _default_compiled = compile_templates(DEFAULT_TEMPLATES)
+    return _default_compiled
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+
+EXECUTOR_KIND = os.getenv("VHC_PARSE_EXECUTOR", "thread")  # thread | process | inline
+PARSE_WORKERS = int(os.getenv("VHC_PARSE_WORKERS", "2"))
+PARSE_CHUNK_SIZE = int(os.getenv("VHC_PARSE_CHUNK_SIZE", "100"))
+MAX_PENDING_CHUNKS = int(os.getenv("VHC_PARSE_MAX_PENDING", str(PARSE_WORKERS * 2)))
+LAG_SAMPLE_INTERVAL = 0.05
+
+
+# -----------------------------
+# Message snapshots
+# -----------------------------
+# discord.Message holds a reference to the connection state and cannot cross a
+# process boundary; parsers only read these few attributes.
+class _Ref:
+    __slots__ = ("id",)
+
+    def __init__(self, id: int):
+        self.id = id
+
+
+class _Attachment:
+    __slots__ = ("url",)
+
+    def __init__(self, url: str):
+        self.url = url
+
+
+class MessageSnapshot:
+    __slots__ = ("id", "content", "channel", "author", "created_at", "attachments")
+
+    def __init__(self, id, content, channel, author, created_at, attachments):
+        self.id = id
+        self.content = content
+        self.channel = channel
+        self.author = author
+        self.created_at = created_at
+        self.attachments = attachments
+
+    def __getstate__(self):
+        return (self.id, self.content, self.channel.id, self.author.id, self.created_at,
+                [a.url for a in self.attachments])
+
+    def __setstate__(self, state):
+        id, content, channel_id, author_id, created_at, urls = state
+        self.__init__(id, content, _Ref(channel_id), _Ref(author_id), created_at,
+                      [_Attachment(u) for u in urls])
+
+
+def snapshot_message(message) -> MessageSnapshot:
+    return MessageSnapshot(
+        message.id,
+        message.content or "",
+        _Ref(message.channel.id),
+        _Ref(message.author.id),
+        message.created_at,
+        [_Attachment(a.url) for a in message.attachments],
+    )
+
+
+def parse_chunk(snapshots: list, templates=None) -> list:
+    """
+    Executor entry point: parse a chunk of snapshots into (result, terms)
+    pairs, in message order. terms is the record's search-index term counts
+    (None for a Quarantined result), computed here so the event loop never
+    tokenizes.
+    """
+    # Imported on first use so the bot can start without loading the parsers
+    from parser import parse_message
+    from records import Quarantined
+    from search_index import record_terms
+    results = []
+    for s in snapshots:
+        for result in parse_message(s, templates):
+            terms = None if isinstance(result, Quarantined) else dict(record_terms(result))
+            results.append((result, terms))
+    return results
+
+
+# -----------------------------
+# Executor
+# -----------------------------
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Optional[Executor]:
+    global _executor
+    if EXECUTOR_KIND == "inline":
+        return None
+    if _executor is None:
+        if EXECUTOR_KIND == "process":
+            _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="vhc-parse")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# -----------------------------
+# Chunked parse pipeline
+# -----------------------------
+class ParsePipeline:
+    """
+    Buffers messages into chunks, parses each chunk off the event loop and
+    hands results back in message order. At most max_pending chunks are in
+    flight; feed() waits on the oldest one beyond that.
+    """
+
+    def __init__(self, templates=None, chunk_size: int = PARSE_CHUNK_SIZE, max_pending: int = MAX_PENDING_CHUNKS):
+        self._templates = templates
+        self._chunk_size = max(1, chunk_size)
+        self._max_pending = max(1, max_pending)
+        self._executor = get_executor()
+        self._buffer = []
+        self._pending = deque()
+
+    def _submit(self):
+        if not self._buffer:
+            return
+        chunk, self._buffer = self._buffer, []
+        if self._executor is None:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(parse_chunk(chunk, self._templates))
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, parse_chunk, chunk, self._templates)
+        self._pending.append(future)
+
+    async def _collect(self, drain: bool = False) -> list:
+        results = []
+        while self._pending:
+            head = self._pending[0]
+            if not head.done() and not drain and len(self._pending) <= self._max_pending:
+                break
+            results.extend(await head)
+            self._pending.popleft()
+        return results
+
+    async def feed(self, message) -> list:
+        self._buffer.append(snapshot_message(message))
+        if len(self._buffer) >= self._chunk_size:
+            self._submit()
+        return await self._collect()
+
+    async def flush(self) -> list:
+        self._submit()
+        return await self._collect(drain=True)
+
+    def cancel(self):
+        self._buffer = []
+        while self._pending:
+            self._pending.popleft().cancel()
+
+
+# -----------------------------
+# Event-loop lag monitor
+# -----------------------------
+class LoopLagMonitor:
+    """
+    Samples how late the loop wakes a sleeping task. `worst` is the longest
+    stall seen while the monitor was running, in seconds.
+    """
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.worst = 0.0
+        self.total = 0.0
+        self.samples = 0
+        self._task = None
+        self._sample_started = None
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.samples if self.samples else 0.0
+
+    def _record(self, start: float):
+        lag = max(0.0, time.perf_counter() - start - self.interval)
+        self.samples += 1
+        self.total += lag
+        if lag > self.worst:
+            self.worst = lag
+
+    async def _run(self):
+        while True:
+            self._sample_started = start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._sample_started = None
+            self._record(start)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # A stall that runs right up to stop() never wakes the sampler;
+            # count the sample in progress instead of dropping it
+            if self._sample_started is not None:
+                self._record(self._sample_started)
+                self._sample_started = None
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def __aenter__(self):
+        self.start()
+        # Let the sampler take its first timestamp, so a blocking call right
+        # after entering is measured instead of delaying the first sample
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()